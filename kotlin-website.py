@@ -2,39 +2,70 @@ import copy
 import datetime
 import json
 import os
+import posixpath
 import sys
 import threading
-from hashlib import md5
 from os import path
 from urllib.parse import urlparse, urljoin, ParseResult
 
-from ruamel.yaml import YAML, YAMLError
 from bs4 import BeautifulSoup
 from flask import Flask, render_template, Response, send_from_directory, request
 from flask.helpers import url_for, send_file, make_response
 from flask.views import View
-from flask_frozen import Freezer, walk_directory
+from werkzeug.security import safe_join
+from flask_frozen import Freezer
 
 from src.api import get_api_page
+from src.assets import AssetManifest
+from src.build import profiler
+from src.build.dependencies import DependencyTrackingEnvironment, record_input
+from src.build.compress import compress_folders
+from src.build.freeze import freeze
+from src.build.graph import BuildGraph, code_signature
 from src.github import assert_valid_git_hub_url
-from src.ktl_components import KTLComponentExtension
+from src.ktl_components import KTLComponentExtension, set_component_cache_enabled, component_cache, \
+    batching_components, get_bundle_hash
+from src.links.anchors import AnchorIndex
+from src.links.checker import LinkChecker
+from src.links.resolver import LinkResolver
+from src.markdown.makrdown import set_kramdown_workers, set_render_cache_enabled, render_cache
+from src.page_cache import PageCache
 from src.pages.MyFlatPages import MyFlatPages
 from src.processors.processors import set_replace_simple_code
-
-yaml = YAML(typ='rt')
+from src.redirects import RedirectIndex, get_redirect_files, generate_redirect_pages, redirects_folder
+from src.search.export import RecordStore, SearchBackend, export_records, get_search_backend, push_delta, \
+    local_records_file, seed_delta
+from src.search.index import SearchIndex, build_search_index
+from src.serve import add_production_headers, run_production_server, send_precompressed, \
+    send_precompressed_from_directory
+from src.site_data import SiteData
+from src.sitemap import SitemapWriter, read_sitemap_urls
 
 app = Flask(__name__, static_folder='_assets')
+app.jinja_environment = DependencyTrackingEnvironment
 app.config.from_pyfile('mysettings.py')
 app.jinja_env.trim_blocks = True
 app.jinja_env.lstrip_blocks = True
 pages = MyFlatPages(app)
+anchor_index = AnchorIndex(pages)
 freezer = Freezer(app)
 ignore_stdlib = False
 build_mode = False
 build_contenteditable = False
 build_check_links = True
+build_workers = 1
+build_incremental = False
+link_report = "link-report.json"
+search_delta = "search-delta.json"
+search_push = False
+build_profile = None
+build_profile_memory = False
+serve_production = False
+build_compress = False
 build_errors = []
-url_adapter = app.create_url_adapter(None)
+page_cache = PageCache(256 * 1024 * 1024)
+# app.create_url_adapter(None) is None unless SERVER_NAME is configured
+url_adapter = app.url_map.bind('localhost')
 
 root_folder = path.join(os.path.dirname(__file__))
 data_folder = path.join(os.path.dirname(__file__), "data")
@@ -42,60 +73,41 @@ data_folder = path.join(os.path.dirname(__file__), "data")
 _nav_cache = None
 _nav_lock = threading.RLock()
 
-_cached_asset_version = {}
+asset_manifest = AssetManifest({
+    '/_assets/': path.join(root_folder, '_assets'),
+    '/assets/': path.join(root_folder, 'assets'),
+})
 
 
 def get_asset_version(filename):
-    if filename in _cached_asset_version:
-        return _cached_asset_version[filename]
-
-    filepath = (root_folder if root_folder else ".") + filename
-    if filename and path.exists(filepath):
-        with open(filepath, 'rb') as file:
-            digest = md5(file.read()).hexdigest()
-            _cached_asset_version[filename] = digest
-            return digest
-    return None
-
-
-def redirect_to_map(redirects_list):
-    result = {}
-
-    for item in redirects_list:
-        key = item["from"]
-        result.update({
-            f"{key}": item["to"]
-        })
-
-    return result
+    if not filename:
+        return None
+    asset_file = asset_manifest.get_file(filename)
+    if asset_file is not None:
+        # The version is part of the page
+        record_input('data', asset_file)
+    return asset_manifest.version(filename)
 
 
 def get_site_data():
-    data = {}
+    files = {}
     for data_file in os.listdir(data_folder):
         if data_file.startswith('_'):
             continue
         if not data_file.endswith(".yml"):
             continue
-        data_file_path = path.join(data_folder, data_file)
-        with open(data_file_path, encoding="UTF-8") as stream:
-            try:
-                file_name_without_extension = data_file[:-4] if data_file.endswith(".yml") else data_file
-                data[file_name_without_extension] = yaml.load(stream)
-            except YAMLError as exc:
-                sys.stderr.write('Cant parse data file ' + data_file + ': ')
-                sys.stderr.write(str(exc))
-                sys.exit(-1)
-            except IOError as exc:
-                sys.stderr.write('Cant read data file ' + data_file + ': ')
-                sys.stderr.write(str(exc))
-                sys.exit(-1)
-    data["core"] = redirect_to_map(
-        yaml.load(open("redirects/stdlib-redirects.yml", encoding="UTF-8")))
-    return data
+        files[data_file[:-4]] = path.join(data_folder, data_file)
+    return SiteData(files, {"core": api_redirects})
 
 
+redirect_index = RedirectIndex(get_redirect_files())
+# site.data.core holds the redirects of the old API pages, as before the index
+api_redirects = RedirectIndex(redirect_index.files,
+                              selected=[path.join(redirects_folder, 'stdlib-redirects.yml')])
 site_data = get_site_data()
+# Edited data files are loaded again, whether a cached page uses them or not
+page_cache.add_listener(site_data.reload)
+page_cache.watch_files(site_data.files.values())
 
 
 def get_countries_size():
@@ -114,7 +126,6 @@ def get_education_courses():
             for x in site_data['universities']]
 
 
-
 @app.context_processor
 def add_year_to_context():
     return {
@@ -178,63 +189,64 @@ def kotlin_docs_pdf():
 
 @app.route('/docs/<path:path>')
 def docs(path):
-    return send_from_directory('dist/docs/', path)
+    return send_precompressed_from_directory(os.path.join(root_folder, 'dist', 'docs'), path)
 
 
 @app.route('/_next/<path:path>')
 def static_file(path):
-    return send_from_directory('out/_next/', path)
+    return send_precompressed_from_directory(os.path.join(root_folder, 'out', '_next'), path)
 
 
 @app.route('/community/')
 def community_page():
-    return send_file(path.join(root_folder, 'out', 'community/index.html'))
+    return send_precompressed(path.join(root_folder, 'out', 'community/index.html'))
 
 
 @app.route('/community/events/')
 def community_events_page():
-    return send_file(path.join(root_folder, 'out', 'community/events/index.html'))
+    return send_precompressed(path.join(root_folder, 'out', 'community/events/index.html'))
 
 
 @app.route('/community/user-groups/')
 def community_user_groups_page():
-    return send_file(path.join(root_folder, 'out', 'community/user-groups/index.html'))
+    return send_precompressed(path.join(root_folder, 'out', 'community/user-groups/index.html'))
 
 
 @app.route('/education/')
 def education_page():
-    return send_file(path.join(root_folder, 'out', 'education/index.html'))
+    return send_precompressed(path.join(root_folder, 'out', 'education/index.html'))
 
 
 @app.route('/education/why-teach-kotlin/')
 def why_teach_page():
-    return send_file(path.join(root_folder, 'out', 'education/why-teach-kotlin/index.html'))
+    return send_precompressed(path.join(root_folder, 'out', 'education/why-teach-kotlin/index.html'))
 
 
 @app.route('/education/courses/')
 def education_courses():
-    return send_file(path.join(root_folder, 'out', 'education/courses/index.html'))
+    return send_precompressed(path.join(root_folder, 'out', 'education/courses/index.html'))
 
 
 @app.route('/')
 def next_index_page():
-    return send_file(path.join(root_folder, 'out', 'index.html'))
+    return send_precompressed(path.join(root_folder, 'out', 'index.html'))
 
 @app.route('/backend/')
 def next_backend_page():
-    return send_file(path.join(root_folder, 'out', 'backend/index.html'))
+    return send_precompressed(path.join(root_folder, 'out', 'backend/index.html'))
 
 @app.route('/multiplatform/')
 def next_multiplatform_page():
-    return send_file(path.join(root_folder, 'out', 'multiplatform/index.html'))
+    return send_precompressed(path.join(root_folder, 'out', 'multiplatform/index.html'))
 
 @app.route('/case-studies/')
 def next_case_studies_page():
-    return send_file(path.join(root_folder, 'out', 'case-studies/index.html'))
+    return send_precompressed(path.join(root_folder, 'out', 'case-studies/index.html'))
 
 
 def process_page(page_path):
     page = pages.get_or_404(page_path)
+    record_input('source', get_page_file(page_path))
 
     if 'date' in page.meta and page['date'] is not None:
         page.meta['formatted_date'] = page.meta['date'].strftime('%d %B %Y')
@@ -254,15 +266,53 @@ def process_page(page_path):
         template += ".html"
 
     if build_check_links:
-        validate_links_weak(page, page_path)
-
-    return render_template(
-        template,
-        page=page,
-        baseurl="",
-        edit_on_github_url=edit_on_github_url,
-
-    )
+        with profiler.stage('links'):
+            validate_links_weak(page, page_path)
+
+    with profiler.stage('template'):
+        return render_page_template(
+            template,
+            page=page,
+            baseurl="",
+            edit_on_github_url=edit_on_github_url,
+
+        )
+
+
+def resolve_api_file(params):
+    page_path = params['page_path']
+    if path.splitext(page_path)[1] or path.basename(page_path) == "package-list":
+        return safe_join(root_folder, 'api', page_path)
+    return safe_join(root_folder, 'api', page_path.rstrip('/'), 'index.html')
+
+
+link_resolver = LinkResolver(url_adapter, lambda url_path: app.test_client().get(url_path).status_code != 404)
+link_resolver.register_file('kotlin_reference_pdf', path.join(root_folder, "assets", "kotlin-reference.pdf"))
+link_resolver.register_file('kotlin_docs_pdf', path.join(root_folder, "assets", "kotlin-reference.pdf"))
+link_resolver.register_directory('docs', path.join(root_folder, 'dist', 'docs'))
+link_resolver.register_directory('static_file', path.join(root_folder, 'out', '_next'))
+link_resolver.register_directory('asset', path.join(root_folder, 'assets'))
+link_resolver.register_directory('tutorial_img', path.join(root_folder, 'assets', 'images', 'tutorials'), 'filename')
+link_resolver.register_directory('static', app.static_folder, 'filename')
+link_resolver.register('api_page', resolve_api_file)
+link_resolver.register_file('page_404', path.join(root_folder, 'out', '404.html'))
+for next_endpoint, next_file in [
+    ('community_page', 'community/index.html'),
+    ('community_events_page', 'community/events/index.html'),
+    ('community_user_groups_page', 'community/user-groups/index.html'),
+    ('education_page', 'education/index.html'),
+    ('why_teach_page', 'education/why-teach-kotlin/index.html'),
+    ('education_courses', 'education/courses/index.html'),
+    ('next_index_page', 'index.html'),
+    ('next_backend_page', 'backend/index.html'),
+    ('next_multiplatform_page', 'multiplatform/index.html'),
+    ('next_case_studies_page', 'case-studies/index.html'),
+]:
+    link_resolver.register_file(next_endpoint, path.join(root_folder, 'out', next_file))
+
+
+def get_page_file(page_path):
+    return path.join(pages.root, page_path + app.config['FLATPAGES_EXTENSION'])
 
 
 def validate_links_weak(page, page_path):
@@ -276,12 +326,12 @@ def validate_links_weak(page, page_path):
 
         endpoint, params = url_adapter.match(href.path, 'GET', query_args={})
         if endpoint != 'page' and endpoint != 'get_index_page':
-            response = app.test_client().get(href.path)
-            if response.status_code == 404:
+            if not link_resolver.exists(href.path):
                 build_errors.append("Broken link: " + str(href.path) + " on page " + page_path)
             continue
 
         referenced_page = pages.get(params['page_path'])
+        record_input('links', get_page_file(params['page_path']))
         if referenced_page is None:
             build_errors.append("Broken link: " + str(href.path) + " on page " + page_path)
             continue
@@ -289,20 +339,7 @@ def validate_links_weak(page, page_path):
         if href.fragment == '':
             continue
 
-        ids = []
-        for x in referenced_page.parsed_html.select('h1,h2,h3,h4'):
-            try:
-                ids.append(x['id'])
-            except KeyError:
-                pass
-
-        for x in referenced_page.parsed_html.select('a'):
-            try:
-                ids.append(x['name'])
-            except KeyError:
-                pass
-
-        if href.fragment not in ids:
+        if href.fragment not in anchor_index.get(params['page_path']):
             build_errors.append("Bad anchor: " + str(href.fragment) + " on page " + page_path)
 
     if not build_mode and len(build_errors) > 0:
@@ -324,12 +361,12 @@ def page():
 
 @app.route('/<path:page_path>.html')
 def page(page_path):
-    return process_page(page_path)
+    return page_cache.render(page_path, lambda: process_page(page_path))
 
 
 @app.route('/404.html')
 def page_404():
-    return send_file(path.join(root_folder, 'out', '404.html'))
+    return send_precompressed(path.join(root_folder, 'out', '404.html'))
 
 
 @freezer.register_generator
@@ -340,6 +377,27 @@ def api_page():
             yield {'page_path': path.join(path.relpath(root, api_folder), file).replace(os.sep, '/')}
 
 
+def get_sitemap_urls():
+    """:return: generator of the urls of the html pages yielded by the `page` and `api_page` freezer generators"""
+    generators = [generator for generator in freezer.url_generators if generator.__name__ in ('page', 'api_page')]
+    with app.test_request_context():
+        for generator in generators:
+            for values in generator():
+                url = posixpath.normpath(url_for(generator.__name__, **values))
+                if url.endswith('.html'):
+                    yield url
+
+
+def write_sitemap(out_folder):
+    # Pages also in dist/ are already in its sitemap.xml, see the "Build site pages" CI job
+    exclude = read_sitemap_urls(path.join(root_folder, 'dist', 'sitemap.xml'))
+    with SitemapWriter(out_folder, exclude=exclude) as sitemap:
+        for url in get_sitemap_urls():
+            sitemap.add(url, path.join(out_folder, *freezer.urlpath_to_filepath(url).split('/')))
+    print("Sitemap: %d urls in %d files, %d changed, %d already in dist/sitemap.xml" %
+          (len(sitemap.entries), len(sitemap.shards), sitemap.changed, sitemap.excluded))
+
+
 class RedirectTemplateView(View):
     def __init__(self, url):
         self.redirect_url = url
@@ -350,7 +408,7 @@ class RedirectTemplateView(View):
 
 @app.errorhandler(404)
 def page_not_found(e):
-    return send_file(path.join(root_folder, 'out', '404.html')), 404
+    return send_precompressed(path.join(root_folder, 'out', '404.html')), 404
 
 
 app.register_error_handler(404, page_not_found)
@@ -369,22 +427,36 @@ def api_page(page_path):
 
 
 def process_api_page(page_path):
-    return render_template(
-        'api.html',
-        page=get_api_page(build_mode, page_path)
-    )
+    return page_cache.render('api/' + page_path, lambda: render_api_page(page_path))
+
+
+def render_api_page(page_path):
+    with profiler.stage('api'):
+        api_content = get_api_page(build_mode, page_path)
+    with profiler.stage('template'):
+        return render_page_template('api.html', page=api_content)
+
+
+def render_page_template(template, **context):
+    """`render_template()`, with the ktl_components of the page sent to the renderer in one batch"""
+    with batching_components() as batch:
+        html = render_template(template, **context)
+    return batch.substitute(html)
 
 
 def respond_with_package_list(page_path):
     file_path = path.join(root_folder, 'api', page_path)
     if not path.exists(file_path):
         return make_response(path.basename(page_path) + " not found", 404)
-    return send_file(file_path, mimetype="text/plain")
+    return send_precompressed(file_path, mimetype="text/plain")
 
 
 @app.route('/assets/<path:path>')
 def asset(path):
-    return send_from_directory('assets', path)
+    asset_file = safe_join(root_folder, 'assets', path)
+    if asset_file is not None:
+        record_input('source', asset_file)
+    return send_precompressed_from_directory(os.path.join(root_folder, 'assets'), path)
 
 
 @app.route('/assets/images/tutorials/<path:filename>')
@@ -394,7 +466,7 @@ def tutorial_img(filename):
 
 @freezer.register_generator
 def asset():
-    for filename in walk_directory(path.join(root_folder, "assets")):
+    for filename in asset_manifest.files('/assets/'):
         yield {'path': filename}
 
 
@@ -411,11 +483,26 @@ def get_index_page(page_path):
     """
     if not page_path.endswith('/'):
         page_path += '/'
-    return process_page(page_path + 'index')
+    return page_cache.render(page_path + 'index', lambda: process_page(page_path + 'index'))
+
+
+search_index = SearchIndex()
+
+
+def local_search():
+    """Search over the local index built with the 'search-index' command, for previews and offline mirrors"""
+    query = request.args.get('q', '')
+    try:
+        limit = min(int(request.args.get('limit', 20)), 100)
+    except ValueError:
+        limit = 20
+    return Response(json.dumps(search_index.search(query, limit), ensure_ascii=False), mimetype='application/json')
 
 
 @app.after_request
 def add_header(request):
+    if serve_production:
+        return add_production_headers(request)
     request.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
     request.headers["Pragma"] = "no-cache"
     request.headers["Expires"] = "0"
@@ -436,6 +523,34 @@ if __name__ == '__main__':
             build_check_links = False
         elif arg == "--editable":
             build_contenteditable = True
+        elif arg == "--no-render-cache":
+            set_render_cache_enabled(False)
+            set_component_cache_enabled(False)
+        elif arg == "--clear-render-cache":
+            render_cache.clear()
+            component_cache.clear()
+        elif arg == "--compress":
+            build_compress = True
+        elif arg == "--incremental":
+            build_incremental = True
+        elif arg == "--parallel":
+            build_workers = os.cpu_count() or 1
+        elif arg.startswith("--parallel="):
+            build_workers = int(arg[len("--parallel="):])
+        elif arg.startswith("--link-report="):
+            link_report = arg[len("--link-report="):]
+        elif arg == "--profile":
+            build_profile = "build-profile.json"
+        elif arg.startswith("--profile="):
+            build_profile = arg[len("--profile="):]
+        elif arg == "--profile-memory":
+            build_profile_memory = True
+        elif arg.startswith("--search-delta="):
+            search_delta = arg[len("--search-delta="):]
+        elif arg == "--push":
+            search_push = True
+        elif arg.startswith("--kramdown-workers="):
+            set_kramdown_workers(int(arg[len("--kramdown-workers="):]))
         else:
             argv_copy.append(arg)
 
@@ -443,6 +558,12 @@ if __name__ == '__main__':
     print("ignore_stdlib: " + str(ignore_stdlib))
     print("build_check_links: " + str(build_check_links))
     print("build_contenteditable: " + str(build_contenteditable))
+    print("build_workers: " + str(build_workers))
+    print("build_incremental: " + str(build_incremental))
+    print("build_compress: " + str(build_compress))
+    print("build_profile: " + str(build_profile))
+    print("build_profile_memory: " + str(build_profile_memory))
+    print("search_push: " + str(search_push))
     print("\n\n")
 
     set_replace_simple_code(build_contenteditable)
@@ -450,14 +571,102 @@ if __name__ == '__main__':
     if len(argv_copy) > 1:
         if argv_copy[1] == "build":
             build_mode = True
-
-            urls = freezer.freeze()
+            link_resolver.memoize = True
+
+            # The components bundle isn't recorded as an input of the pages, so a change of it rebuilds everything
+            graph = BuildGraph(code_signature(build_contenteditable, build_check_links, ignore_stdlib, get_bundle_hash()))
+            if build_incremental:
+                graph.load()
+            # Compile the redirect index and version the assets before forking, the workers share them
+            redirect_index.load()
+            api_redirects.load()
+            asset_manifest.build(os.cpu_count() or 1)
+
+            if build_profile_memory and build_profile is None:
+                build_profile = "build-profile.json"
+            if build_profile is not None:
+                profiler.set_profiling_enabled(True, memory=build_profile_memory)
+            urls = freeze(freezer, build_workers, build_errors, graph)
+            if build_profile is not None:
+                profiler.write_trace(build_profile)
+                print(profiler.get_summary())
+                print("Build profile written to " + build_profile)
+                profiler.set_profiling_enabled(False)
             if len(build_errors) > 0:
                 for error in build_errors:
                     sys.stderr.write(error + '\n')
                 sys.exit(-1)
+
+            write_sitemap(freezer.root)
+            if build_compress:
+                compressible, written = compress_folders([freezer.root], os.cpu_count() or 1)
+                print("Compressed %d files, %d of them changed" % (compressible, written))
+        elif argv_copy[1] == "compress":
+            folders = argv_copy[2:] if len(argv_copy) > 2 else [freezer.root]
+            compressible, written = compress_folders(folders, build_workers if build_workers > 1 else os.cpu_count() or 1)
+            print("Compressed %d files, %d of them changed" % (compressible, written))
+        elif argv_copy[1] == "check-links":
+            roots = argv_copy[2:] if len(argv_copy) > 2 else [freezer.root]
+            checker = LinkChecker(roots, build_workers if build_workers > 1 else os.cpu_count() or 1)
+            errors = checker.run()
+            checker.write_report(link_report)
+            print("Checked %d links on %d pages, %d errors, see %s" %
+                  (checker.checked_links, len(checker.anchors), len(errors), link_report))
+            if len(errors) > 0:
+                sys.exit(-1)
+        elif argv_copy[1] == "redirects":
+            out_folder = argv_copy[2] if len(argv_copy) > 2 else freezer.root
+            redirect_index.load()
+            created, skipped = generate_redirect_pages(redirect_index, out_folder)
+            print("Redirects: %d created, %d skipped (existing files)" % (created, skipped))
+        elif argv_copy[1] == "sitemap":
+            write_sitemap(argv_copy[2] if len(argv_copy) > 2 else freezer.root)
+        elif argv_copy[1] == "search-records":
+            # Only reported unless pushed explicitly
+            backend = SearchBackend()
+            if search_push:
+                backend = get_search_backend()
+                if backend is None:
+                    sys.stderr.write("--push needs WH_SEARCH_USER, WH_SEARCH_WRITE_KEY and ALGOLIA_INDEX_NAME\n")
+                    sys.exit(1)
+            store = RecordStore().load()
+            first_export = not store.pages
+            delta = export_records(store, build_workers if build_workers > 1 else None)
+            if first_export:
+                # Nothing pushed from here before: diff against the records in the index
+                delta = seed_delta(delta, backend.object_ids())
+            with open(search_delta, 'w', encoding="UTF-8") as f:
+                json.dump(delta, f, indent=2, ensure_ascii=False)
+            print("Search records: %d added, %d changed, %d removed, see %s" %
+                  (len(delta['added']), len(delta['changed']), len(delta['removed']), search_delta))
+            push_delta(backend, delta)
+            # The next delta is against what the index has
+            if search_push:
+                store.save()
+        elif argv_copy[1] == "search-index":
+            # The frozen site, as previews and mirrors serve it
+            out_folder = argv_copy[2] if len(argv_copy) > 2 else freezer.root
+            store = RecordStore(local_records_file).load()
+            delta = export_records(store, build_workers if build_workers > 1 else None, out_folder)
+            store.save()
+            print("Search records: %d added, %d changed, %d removed" %
+                  (len(delta['added']), len(delta['changed']), len(delta['removed'])))
+            documents, terms, tokenized = build_search_index(store)
+            print("Search index: %d records, %d terms, %d pages tokenized" % (documents, terms, tokenized))
+        elif argv_copy[1] == "serve":
+            serve_production = True
+            # The served tree doesn't change: links were checked by the build,
+            # and pages are not re-read on every request
+            build_check_links = False
+            app.config['FLATPAGES_AUTO_RELOAD'] = False
+            # Not a part of the frozen site, so registered only when serving
+            app.add_url_rule('/_search', 'local_search', local_search)
+            page_cache.enabled = True
+            run_production_server(app, "0.0.0.0", 8080, build_workers if build_workers > 1 else os.cpu_count() or 1)
         else:
             print("Unknown argument: " + argv_copy[1])
             sys.exit(1)
     else:
+        page_cache.enabled = True
+        app.add_url_rule('/_search', 'local_search', local_search)
         app.run(host="0.0.0.0", port=8080, debug=True, threaded=True, use_debugger=False, use_reloader=False)
@@ -4,6 +4,8 @@ CACHE_TYPE = "null"
 PREFERRED_URL_SCHEME = 'http'
 FLATPAGES_EXTENSION = '.md'
 FLATPAGES_HTML_RENDERER = jinja_aware_markdown
+# 'html.parser' or 'lxml'; lxml is optional and not in requirements.txt, html.parser stays the default
+FLATPAGES_HTML_PARSER = 'html.parser'
 FREEZER_IGNORE_404_NOT_FOUND = True
 FLATPAGES_AUTO_RELOAD = True
 FREEZER_STATIC_IGNORE = ["*"]
@@ -1,14 +1,18 @@
 import { createElement } from 'react';
 import { renderToString } from 'react-dom/server';
 
+export async function renderComponent(name, props, type) {
+    const componentPath = `../../static/js/${type === 'dokka' ? 'page/dokka-template' : 'ktl-component'}/${name}/index.jsx`;
+    const component = await import(componentPath);
+    const { default: Component } = component;
+    return renderToString(createElement(Component, props));
+}
+
 export default async function main() {
      try {
          const name = process.argv[2];
          let props = process.argv[3] ? JSON.parse(process.argv[3]): {};
-         const componentPath = `../../static/js/${process.argv[4] === 'dokka' ? 'page/dokka-template' : 'ktl-component'}/${name}/index.jsx`;
-         const component = await import(componentPath);
-         const { default: Component } = component;
-         console.log(renderToString(createElement(Component, props)));
+         console.log(await renderComponent(name, props, process.argv[4]));
      } catch (e) {
          console.error(e);
          process.exit(1);
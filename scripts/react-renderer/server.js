@@ -0,0 +1,50 @@
+/* eslint-disable import/no-dynamic-require,prefer-template,comma-dangle */
+
+/**
+ * Long-lived renderer used by src/ktl_components.py, instead of running compile.js per component.
+ *
+ * Reads one JSON array of render requests per line from stdin:
+ *   [{"name": "header", "props": {...}, "type": null}, ...]
+ * and writes one JSON array of results per line to stdout, in the same order:
+ *   [{"html": "..."}, {"error": "..."}, ...]
+ *
+ * "html" matches the stdout of compile.js for the same component, "error" its stderr.
+ */
+
+require('./register');
+
+const readline = require('readline');
+const { inspect } = require('util');
+const { renderComponent } = require('./compile.mjs');
+
+const output = process.stdout;
+
+// stdout is reserved for responses, anything the components log goes to stderr
+console.log = console.error;
+console.info = console.error;
+
+async function render({ name, props, type }) {
+  try {
+    return { html: (await renderComponent(name, props || {}, type)) + '\n' };
+  } catch (e) {
+    return { error: inspect(e) + '\n' };
+  }
+}
+
+let queue = Promise.resolve();
+
+readline.createInterface({ input: process.stdin }).on('line', (line) => {
+  queue = queue.then(async () => {
+    let results = [];
+
+    try {
+      for (const request of JSON.parse(line)) {
+        results.push(await render(request));
+      }
+    } catch (e) {
+      results = [{ error: inspect(e) + '\n' }];
+    }
+
+    output.write(JSON.stringify(results) + '\n');
+  });
+});
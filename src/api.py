@@ -1,16 +1,21 @@
+import os
+import pickle
+import threading
 from os import path
 
 import ruamel.yaml as yaml
-from bs4 import BeautifulSoup
-
-from src.processors.processors import process_code_blocks, process_header_ids
+from src.build.dependencies import record_input
+from src.cache import cache_folder
+from src.processors.api_html import process_api_html
 
 root_folder = path.dirname(path.dirname(__file__))
+titles_index_file = path.join(cache_folder, 'api-titles.pickle')
 
-titles = {}
+titles = None
+titles_lock = threading.Lock()
 
 
-def process_titles(row_titles, title_prefix, path_folder, suffix):
+def process_titles(titles, row_titles, title_prefix, path_folder, suffix):
     if path_folder == '.':
         url = title_prefix + "/" + row_titles["url"].replace("./", "") + suffix
     else:
@@ -19,38 +24,87 @@ def process_titles(row_titles, title_prefix, path_folder, suffix):
     if "content" not in row_titles:
         return
     for child_titles in row_titles["content"]:
-        process_titles(child_titles, title_prefix, path_folder, suffix)
+        process_titles(titles, child_titles, title_prefix, path_folder, suffix)
 
 
-def load_api_titles(folder_path):
-    api_title_files_path = path.join(folder_path, 'api', 'latest', 'jvm', 'stdlib', 'index.yml')
+def get_api_title_files(folder_path):
+    return [
+        path.join(folder_path, 'api', 'latest', 'jvm', 'stdlib', 'index.yml'),
+        path.join(folder_path, 'api', 'latest', 'kotlin.test', 'index.yml'),
+    ]
+
+
+def compile_api_titles(folder_path):
+    api_title_files_path, test_title_files_path = get_api_title_files(folder_path)
+    titles = {}
     with open(api_title_files_path) as title_files:
-        process_titles(yaml.load(title_files)[0], 'latest/jvm/stdlib', '.', '')
+        process_titles(titles, yaml.load(title_files)[0], 'latest/jvm/stdlib', '.', '')
 
-    test_title_files_path = path.join(folder_path, 'api', 'latest', 'kotlin.test', 'index.yml')
     with open(test_title_files_path) as title_files:
-        process_titles(yaml.load(title_files)[0], 'latest/kotlin.test',  '.', '')
+        process_titles(titles, yaml.load(title_files)[0], 'latest/kotlin.test',  '.', '')
+    return titles
+
+
+def load_api_titles(folder_path):
+    """Titles of all API pages by page path.
+
+    Walking the index.yml files takes seconds, so the result is kept in
+    `.cache/api-titles.pickle` and reused until the index.yml files change.
+    """
+    stamp = []
+    for title_file_path in get_api_title_files(folder_path):
+        stat = os.stat(title_file_path)
+        stamp.append((path.abspath(title_file_path), stat.st_mtime_ns, stat.st_size))
+
+    try:
+        with open(titles_index_file, 'rb') as f:
+            stored_stamp, stored_titles = pickle.load(f)
+        if stored_stamp == stamp:
+            return stored_titles
+    except (OSError, EOFError, ValueError, pickle.UnpicklingError):
+        pass
+
+    compiled_titles = compile_api_titles(folder_path)
+
+    os.makedirs(cache_folder, exist_ok=True)
+    tmp_file = titles_index_file + '.' + str(os.getpid())
+    with open(tmp_file, 'wb') as f:
+        pickle.dump((stamp, compiled_titles), f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_file, titles_index_file)
+
+    return compiled_titles
+
+
+def get_api_titles(build_mode: bool, dir_path):
+    global titles
+    with titles_lock:
+        if titles is None:
+            try:
+                titles = load_api_titles(dir_path)
+            except FileNotFoundError as e:
+                if build_mode:
+                    raise e
+                else:
+                    print("API module is not included: ", e)
+                    return {}
+    return titles
 
 
 def get_api_page(build_mode: bool, page_path, dir_path=root_folder):
     if not page_path.endswith('.html'):
         page_path += '.html'
-    if len(titles) == 0:
-        try:
-            load_api_titles(dir_path)
-        except FileNotFoundError as e:
-            if build_mode:
-                raise e
-            else:
-                print("API module is not included: ", e)
+    titles = get_api_titles(build_mode, dir_path)
 
     file_path = path.join(dir_path, 'api', page_path)
     if not path.exists(file_path):
         return None
+
+    record_input('source', file_path)
+    for title_file_path in get_api_title_files(dir_path):
+        record_input('data', title_file_path)
+
     with open(file_path) as html_file:
-        html_content = BeautifulSoup(html_file.read(), 'html.parser')
-        html_content = process_code_blocks(html_content)
-        html_content = process_header_ids(html_content)
+        html_content = process_api_html(html_file.read())
         return {
             "title": titles[page_path],
             "content": html_content
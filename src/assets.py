@@ -0,0 +1,110 @@
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from os import path
+
+from flask_frozen import walk_directory
+from werkzeug.security import safe_join
+
+from src.cache import cache_folder
+
+manifest_file = path.join(cache_folder, 'asset-manifest.json')
+
+
+def file_md5(file_path):
+    digest = hashlib.md5()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class AssetManifest:
+    """Versions (MD5 of the content) of the files served from `folders`, by url.
+
+    `build()` hashes every file on a thread pool, reusing the versions stored
+    in `.cache/asset-manifest.json` for files whose mtime and size didn't
+    change. `version()` re-checks the file, so edited assets get a new
+    version on the dev server too.
+
+    :param folders: dict of url prefix (e.g. '/assets/') to folder
+    """
+
+    def __init__(self, folders):
+        self.folders = folders
+        # url -> [mtime_ns, size, md5]
+        self.entries = {}
+        self.loaded = False
+        self._lock = threading.Lock()
+
+    def load(self):
+        self.loaded = True
+        try:
+            with open(manifest_file, encoding="UTF-8") as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def save(self):
+        os.makedirs(cache_folder, exist_ok=True)
+        tmp_file = manifest_file + '.' + str(os.getpid())
+        with open(tmp_file, 'w', encoding="UTF-8") as f:
+            json.dump(self.entries, f, sort_keys=True)
+        os.replace(tmp_file, manifest_file)
+
+    def build(self, workers):
+        """Version every file of the folders; files removed since the last build are dropped."""
+        if not self.loaded:
+            self.load()
+
+        files = []
+        for prefix, folder in self.folders.items():
+            if path.isdir(folder):
+                files.extend((prefix + name, path.join(folder, *name.split('/'))) for name in walk_directory(folder))
+
+        with ThreadPoolExecutor(workers) as executor:
+            entries = executor.map(lambda file: self._check(*file), files)
+            self.entries = {url: entry for (url, _), entry in zip(files, entries) if entry is not None}
+        self.save()
+
+    def files(self, prefix):
+        """:return: sorted paths relative to the folder of `prefix` (as `walk_directory()`)"""
+        return sorted(url[len(prefix):] for url in self.entries if url.startswith(prefix))
+
+    def version(self, url):
+        """:return: version of the file served at `url`, or None"""
+        file_path = self.get_file(url)
+        if file_path is None:
+            return None
+        with self._lock:
+            if not self.loaded:
+                self.load()
+        entry = self._check(url, file_path)
+        with self._lock:
+            if entry is None:
+                self.entries.pop(url, None)
+                return None
+            self.entries[url] = entry
+        return entry[2]
+
+    def get_file(self, url):
+        for prefix, folder in self.folders.items():
+            if url.startswith(prefix):
+                return safe_join(folder, url[len(prefix):])
+        return None
+
+    def _check(self, url, file_path):
+        """:return: current [mtime_ns, size, md5] of the file, hashing it only if it changed"""
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        if not path.isfile(file_path):
+            return None
+
+        stored = self.entries.get(url)
+        if stored is not None and stored[0] == stat.st_mtime_ns and stored[1] == stat.st_size:
+            return stored
+        return [stat.st_mtime_ns, stat.st_size, file_md5(file_path)]
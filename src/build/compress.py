@@ -0,0 +1,86 @@
+import gzip
+import multiprocessing
+import os
+from os import path
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+compressible_extensions = frozenset([
+    '.html', '.htm', '.css', '.js', '.mjs', '.json', '.map', '.svg', '.xml', '.txt', '.md', '.ico', '.ttf', '.eot',
+])
+compressed_suffixes = frozenset(['.br', '.gz'])
+# Below this size the compressed response isn't worth the extra file
+min_size = 1024
+
+
+def get_encodings():
+    """:return: list of (content encoding, file suffix) written by the compression stage"""
+    encodings = [('gzip', '.gz')]
+    if brotli is not None:
+        encodings.insert(0, ('br', '.br'))
+    return encodings
+
+
+def is_compressible(file_path):
+    name, extension = path.splitext(file_path)
+    return extension.lower() in compressible_extensions or path.basename(file_path) == 'package-list'
+
+
+def is_up_to_date(compressed_path, stat):
+    """Compressed siblings get the mtime of their source, see `compress_file()`."""
+    try:
+        return os.stat(compressed_path).st_mtime_ns == stat.st_mtime_ns
+    except OSError:
+        return False
+
+
+def compress_file(file_path):
+    """Write the missing or outdated `.gz` (and `.br` with brotli installed) siblings of `file_path`.
+
+    :return: number of files written
+    """
+    stat = os.stat(file_path)
+    if stat.st_size < min_size:
+        return 0
+
+    data = None
+    written = 0
+    for encoding, suffix in get_encodings():
+        compressed_path = file_path + suffix
+        if is_up_to_date(compressed_path, stat):
+            continue
+        if data is None:
+            with open(file_path, 'rb') as f:
+                data = f.read()
+
+        if encoding == 'br':
+            compressed = brotli.compress(data, quality=11)
+        else:
+            compressed = gzip.compress(data, compresslevel=9, mtime=0)
+
+        tmp_path = compressed_path + '.' + str(os.getpid())
+        with open(tmp_path, 'wb') as f:
+            f.write(compressed)
+        os.utime(tmp_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        os.replace(tmp_path, compressed_path)
+        written += 1
+    return written
+
+
+def compress_folders(folders, workers):
+    """Pre-compress every compressible file under `folders` in a pool of `workers` processes.
+
+    :return: tuple of (compressible files, compressed files written)
+    """
+    files = []
+    for folder in folders:
+        for root, dirs, names in os.walk(folder):
+            files.extend(path.join(root, name) for name in names if is_compressible(name))
+
+    with multiprocessing.Pool(workers) as pool:
+        written = sum(pool.imap_unordered(compress_file, files, chunksize=64))
+
+    return len(files), written
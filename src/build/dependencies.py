@@ -0,0 +1,68 @@
+import os
+import threading
+from contextlib import contextmanager
+
+from flask.templating import Environment
+
+_local = threading.local()
+
+categories = ('source', 'includes', 'templates', 'data', 'links')
+
+# An output read from a file modified this recently (ns) may not match the file:
+# it may have changed while it was read, and mtimes come from a coarse clock
+unstable_window = 1000 * 1000 * 1000
+
+
+def get_fingerprint(file_path):
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class Dependencies:
+    """Input files read while rendering one output, grouped by category.
+
+    With `fingerprints`, the (mtime, size) of every file is also taken when it
+    is first recorded, i.e. as it is read, not after the render.
+    """
+
+    def __init__(self, fingerprints=False):
+        self.inputs = {category: set() for category in categories}
+        self.fingerprints = {} if fingerprints else None
+
+    def to_json(self):
+        return {category: sorted(files) for category, files in self.inputs.items() if files}
+
+
+@contextmanager
+def recording_dependencies(fingerprints=False):
+    """Collect everything passed to `record_input()` on this thread inside the block."""
+    previous = getattr(_local, 'dependencies', None)
+    dependencies = Dependencies(fingerprints)
+    _local.dependencies = dependencies
+    try:
+        yield dependencies
+    finally:
+        _local.dependencies = previous
+
+
+def record_input(category, file_path):
+    dependencies = getattr(_local, 'dependencies', None)
+    if dependencies is not None:
+        dependencies.inputs[category].add(file_path)
+        if dependencies.fingerprints is not None and file_path not in dependencies.fingerprints:
+            dependencies.fingerprints[file_path] = get_fingerprint(file_path)
+
+
+class DependencyTrackingEnvironment(Environment):
+    """Jinja environment recording every template file that is loaded, including
+    `extends`, `include` and `import` targets."""
+
+    def get_template(self, name, parent=None, globals=None):
+        template = super().get_template(name, parent, globals)
+        if template.filename is not None:
+            record_input('templates', template.filename)
+        return template
+
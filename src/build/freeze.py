@@ -0,0 +1,145 @@
+import multiprocessing
+import os
+from unicodedata import normalize
+
+from flask_frozen import walk_directory
+
+from src.build import profiler
+from src.build.compress import compressed_suffixes
+from src.build.dependencies import recording_dependencies
+
+# State shared with the forked workers, set up by freeze()
+_freezer = None
+_errors = None
+_graph = None
+
+chunk_size = 32
+
+
+def _generate_urls(freezer, with_generators=True):
+    """Run Frozen-Flask's URL generation, optionally only over the logged `url_for()` calls."""
+    generators = freezer.url_generators
+    if not with_generators:
+        freezer.url_generators = []
+    try:
+        return list(freezer._generate_all_urls())
+    finally:
+        freezer.url_generators = generators
+
+
+def _build_chunk(urls):
+    built_files = []
+    linked_urls = []
+    records = []
+
+    for url, last_modified in urls:
+        filename = os.path.join(_freezer.root, *_freezer.urlpath_to_filepath(url).split('/'))
+        if _graph is not None and _graph.is_fresh(url, filename):
+            built_files.append(filename)
+            linked_urls.extend((linked_url, endpoint, None) for linked_url, endpoint in _graph.linked_urls(url))
+            continue
+
+        errors_before = len(_errors)
+        with recording_dependencies(fingerprints=True) as dependencies, profiler.page(url):
+            built_files.append(_freezer._build_one(url, last_modified))
+
+        logged_urls = _generate_urls(_freezer, with_generators=False)
+        linked_urls.extend(logged_urls)
+        if len(_errors) == errors_before:
+            records.append((url, dependencies.to_json(), [[linked_url, endpoint] for linked_url, endpoint, _ in logged_urls],
+                            dependencies.fingerprints))
+        else:
+            # Pages with build errors are rendered again next time, to report the errors again
+            records.append((url, None, None, None))
+
+    errors = list(_errors)
+    _errors.clear()
+
+    return built_files, linked_urls, errors, records, profiler.drain_events()
+
+
+def freeze(freezer, workers, errors, graph=None):
+    """The same as `freezer.freeze()`, but with parallel and incremental builds.
+
+    URLs from the registered generators are split in chunks, with several
+    `workers` every chunk is rendered and written by a forked process. URLs
+    discovered through `url_for()` while rendering are built in the following
+    rounds, and the `errors` collected by the workers are merged back into `errors`.
+
+    With a `graph` of the previous build, urls whose inputs didn't change are
+    not rendered again; the graph is updated with the inputs of the rendered ones.
+
+    :return: set of frozen urls
+    """
+    global _freezer, _errors, _graph
+    _freezer = freezer
+    _errors = errors
+    _graph = graph
+
+    app = freezer.app
+    remove_extra = app.config['FREEZER_REMOVE_EXTRA_FILES']
+    if not os.path.isdir(freezer.root):
+        os.makedirs(freezer.root)
+    if remove_extra:
+        ignore = app.config['FREEZER_DESTINATION_IGNORE']
+        previous_files = set(
+            normalize('NFC', os.path.join(freezer.root, *name.split('/')))
+            for name in walk_directory(freezer.root, ignore=ignore))
+
+    seen_urls = set()
+    seen_endpoints = set()
+    built_files = set()
+    rendered = 0
+
+    pool = multiprocessing.get_context('fork').Pool(workers) if workers > 1 else None
+    try:
+        pending = _generate_urls(freezer)
+        while pending:
+            round_urls = []
+            for url, endpoint, last_modified in pending:
+                seen_endpoints.add(endpoint)
+                if url in seen_urls:
+                    continue
+                seen_urls.add(url)
+                round_urls.append((url, last_modified))
+
+            chunks = [round_urls[i:i + chunk_size] for i in range(0, len(round_urls), chunk_size)]
+            results = pool.imap_unordered(_build_chunk, chunks) if pool is not None else map(_build_chunk, chunks)
+
+            pending = []
+            for chunk_files, linked_urls, chunk_errors, records, events in results:
+                built_files.update(normalize('NFC', filename) for filename in chunk_files)
+                pending.extend(linked_urls)
+                errors.extend(chunk_errors)
+                rendered += len(records)
+                profiler.add_events(events)
+                if graph is not None:
+                    for url, inputs, urls, fingerprints in records:
+                        if inputs is None:
+                            graph.outputs.pop(url, None)
+                        else:
+                            graph.update(url, inputs, urls, fingerprints)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    print("Frozen %d urls, %d of them rendered" % (len(seen_urls), rendered))
+
+    freezer._check_endpoints(seen_endpoints)
+    if remove_extra:
+        for extra_file in previous_files - built_files:
+            source_file, extension = os.path.splitext(extra_file)
+            if extension in compressed_suffixes and source_file in built_files:
+                # Written by the compression stage, which checks that it is up to date
+                continue
+            os.remove(extra_file)
+            parent = os.path.dirname(extra_file)
+            if not os.listdir(parent):
+                os.removedirs(parent)
+
+    if graph is not None:
+        graph.retain(seen_urls)
+        graph.save()
+
+    return seen_urls
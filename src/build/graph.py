@@ -0,0 +1,145 @@
+import hashlib
+import json
+import os
+import time
+from os import path
+
+from src.build.dependencies import get_fingerprint, unstable_window
+from src.cache import cache_folder, root_folder
+
+graph_file = path.join(cache_folder, 'build-graph.json')
+
+
+def file_sha1(file_path):
+    digest = hashlib.sha1()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def code_signature(*extras):
+    """Hash of the generator code and settings: when they change every output is stale."""
+    digest = hashlib.sha1()
+    code_files = [path.join(root_folder, 'kotlin-website.py'), path.join(root_folder, 'mysettings.py')]
+    for root, dirs, files in os.walk(path.join(root_folder, 'src')):
+        dirs.sort()
+        code_files.extend(path.join(root, file) for file in sorted(files) if not file.endswith('.pyc'))
+    for file_path in code_files:
+        digest.update(path.relpath(file_path, root_folder).encode("utf8"))
+        digest.update(file_sha1(file_path).encode("utf8"))
+    for extra in extras:
+        digest.update(str(extra).encode("utf8"))
+    return digest.hexdigest()
+
+
+class BuildGraph:
+    """Dependency graph of the previous build, stored in `.cache/build-graph.json`.
+
+    For every frozen url it keeps the input files the page was rendered from
+    (see `src.build.dependencies`) and the urls it linked through `url_for()`.
+    Input files are fingerprinted by mtime and size, falling back to a content
+    hash, so a touched but unchanged file doesn't invalidate its outputs.
+    Outputs whose inputs changed after they were read are not saved, so they
+    are rendered again by the next build.
+    """
+
+    def __init__(self, signature):
+        self.signature = signature
+        self.outputs = {}
+        self.files = {}
+        self.started = time.time_ns()
+        self._checked = {}
+        # url -> {file: (mtime, size) when it was read} of the outputs rendered by this build
+        self._read = {}
+
+    def load(self):
+        try:
+            with open(graph_file, encoding="UTF-8") as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return
+        if stored.get('signature') != self.signature:
+            print("Generator code or options changed, rebuilding everything")
+            return
+        self.outputs = stored['outputs']
+        self.files = stored['files']
+
+    def save(self):
+        stale = [url for url, fingerprints in self._read.items() if not self._read_unchanged(fingerprints)]
+        for url in stale:
+            self.outputs.pop(url, None)
+        if stale:
+            print("%d pages read inputs that changed during the build, they will be rendered again" % len(stale))
+
+        for output in self.outputs.values():
+            for files in output['inputs'].values():
+                for file in files:
+                    if file not in self._checked:
+                        self._is_unchanged(file)
+
+        self.files = self._fingerprints()
+        os.makedirs(cache_folder, exist_ok=True)
+        tmp_file = graph_file + '.tmp'
+        with open(tmp_file, 'w', encoding="UTF-8") as f:
+            json.dump({'signature': self.signature, 'outputs': self.outputs, 'files': self.files}, f)
+        os.replace(tmp_file, graph_file)
+
+    def is_fresh(self, url, filename):
+        """True if `url` was built before from inputs that didn't change since."""
+        output = self.outputs.get(url)
+        if output is None or not output['inputs'] or not path.isfile(filename):
+            return False
+        return all(self._is_unchanged(file) for files in output['inputs'].values() for file in files)
+
+    def linked_urls(self, url):
+        return [tuple(item) for item in self.outputs[url]['urls']]
+
+    def update(self, url, inputs, urls, fingerprints=None):
+        """:param fingerprints: dict of input file to its fingerprint when it was read, see `Dependencies`"""
+        if fingerprints is not None:
+            self._read[url] = fingerprints
+        self.outputs[url] = {
+            'inputs': {
+                category: [path.relpath(file, root_folder) for file in files]
+                for category, files in inputs.items()
+            },
+            'urls': urls
+        }
+
+    def retain(self, urls):
+        """Forget outputs that are not generated anymore."""
+        self.outputs = {url: output for url, output in self.outputs.items() if url in urls}
+
+    def _read_unchanged(self, fingerprints):
+        for file, fingerprint in fingerprints.items():
+            if fingerprint is None or fingerprint[0] >= self.started - unstable_window:
+                return False
+            if get_fingerprint(file) != fingerprint:
+                return False
+        return True
+
+    def _fingerprints(self):
+        return {file: checked[1] for file, checked in self._checked.items() if checked[1] is not None}
+
+    def _is_unchanged(self, file):
+        checked = self._checked.get(file)
+        if checked is None:
+            checked = self._check(file)
+            self._checked[file] = checked
+        return checked[0]
+
+    def _check(self, file):
+        """:return: tuple of (unchanged, current fingerprint)"""
+        stored = self.files.get(file)
+        try:
+            stat = os.stat(path.join(root_folder, file))
+        except OSError:
+            return False, None
+
+        if stored is not None and stored[0] == stat.st_mtime_ns and stored[1] == stat.st_size:
+            return True, stored
+
+        sha1 = file_sha1(path.join(root_folder, file))
+        fingerprint = [stat.st_mtime_ns, stat.st_size, sha1]
+        return stored is not None and stored[2] == sha1, fingerprint
@@ -0,0 +1,155 @@
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+_local = threading.local()
+
+enabled = False
+trace_memory = False
+# Shared by the forked workers, so their timestamps are on the same timeline
+_origin = 0
+# (name, page, start, duration, self duration, allocated, peak, pid, tid), times in microseconds
+_events = []
+
+
+def set_profiling_enabled(v: bool, memory=False):
+    """Record stage timings from now on, and memory with `memory`.
+
+    Memory is traced with `tracemalloc`, which slows allocation-heavy stages
+    down unevenly: profile timings and memory in separate builds.
+    """
+    global enabled, trace_memory, _origin
+    enabled = v
+    trace_memory = v and memory
+    if v:
+        _origin = time.perf_counter_ns()
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    elif not trace_memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+class _Frame:
+    def __init__(self, name, page):
+        self.name = name
+        self.page = page
+        self.children = 0
+        self.start = time.perf_counter_ns()
+        self.memory = tracemalloc.get_traced_memory()[0]
+        self.peak = 0
+
+
+def _reset_peak():
+    # `tracemalloc.reset_peak()` appeared in Python 3.9, without it only allocations are recorded
+    if trace_memory and hasattr(tracemalloc, 'reset_peak'):
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.reset_peak()
+        return peak
+    return 0
+
+
+@contextmanager
+def stage(name, page=None):
+    """Record the wall time (and memory, if traced) of the block as stage `name` of the current page.
+
+    Stages nest: the time of the inner ones is excluded from the self time of the
+    outer one. Outside of `page()`, `page` names the page the stage belongs to.
+    """
+    if not enabled:
+        yield
+        return
+
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    if page is None:
+        page = stack[-1].page if stack else None
+    # The peak of the parent so far, before it is reset for this stage
+    peak = _reset_peak()
+    if stack:
+        stack[-1].peak = max(stack[-1].peak, peak)
+
+    frame = _Frame(name, page)
+    stack.append(frame)
+    try:
+        yield
+    finally:
+        end = time.perf_counter_ns()
+        current = tracemalloc.get_traced_memory()[0]
+        peak = max(frame.peak, _reset_peak())
+        stack.pop()
+        duration = end - frame.start
+        if stack:
+            stack[-1].children += duration
+            stack[-1].peak = max(stack[-1].peak, peak)
+        _events.append((name, page, (frame.start - _origin) // 1000, duration // 1000,
+                        (duration - frame.children) // 1000, current - frame.memory,
+                        max(peak - frame.memory, 0), os.getpid(), threading.get_ident()))
+
+
+def page(url):
+    """Record the block as the rendering of the page at `url`, see `stage()`."""
+    return stage('page', url)
+
+
+def drain_events():
+    """:return: the events recorded so far in this process, which are removed"""
+    events = list(_events)
+    del _events[:len(events)]
+    return events
+
+
+def add_events(events):
+    _events.extend(events)
+
+
+def write_trace(file_path):
+    """Write the events in the Chrome trace format, for chrome://tracing or https://ui.perfetto.dev"""
+    trace_events = []
+    for name, page, start, duration, self_duration, allocated, peak, pid, tid in _events:
+        args = {'page': page, 'self_us': self_duration}
+        if trace_memory:
+            args.update(allocated=allocated, peak=peak)
+        trace_events.append({
+            'name': page if name == 'page' else name,
+            'cat': name,
+            'ph': 'X',
+            'ts': start,
+            'dur': duration,
+            'pid': pid,
+            'tid': tid,
+            'args': args,
+        })
+    with open(file_path, 'w', encoding="UTF-8") as f:
+        json.dump({'traceEvents': trace_events, 'displayTimeUnit': 'ms'}, f)
+
+
+def get_summary(limit=20):
+    """:return: text with the slowest pages and the time spent in every stage"""
+    pages = sorted((event for event in _events if event[0] == 'page'), key=lambda event: -event[3])
+    stages = {}
+    for name, page, start, duration, self_duration, allocated, peak, pid, tid in _events:
+        if name == 'page':
+            continue
+        total = stages.setdefault(name, [0, 0, 0, 0])
+        total[0] += 1
+        total[1] += self_duration
+        total[2] = max(total[2], self_duration)
+        total[3] = max(total[3], peak)
+
+    def format_peak(peak):
+        return "  %8.1f MB peak" % (peak / 1024 / 1024) if trace_memory else ""
+
+    lines = ["Slowest pages:"]
+    for name, page, start, duration, self_duration, allocated, peak, pid, tid in pages[:limit]:
+        lines.append("  %9.1f ms%s  %s" % (duration / 1000, format_peak(peak), page))
+
+    lines.append("Stages (self time):")
+    for name, (count, self_duration, slowest, peak) in sorted(stages.items(), key=lambda item: -item[1][1]):
+        lines.append("  %-14s %10.1f ms total  %6d calls  %8.2f ms avg  %9.1f ms max%s" %
+                     (name, self_duration / 1000, count, self_duration / 1000 / count, slowest / 1000,
+                      format_peak(peak)))
+    return "\n".join(lines)
@@ -0,0 +1,106 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from os import path
+
+root_folder = path.dirname(path.dirname(__file__))
+cache_folder = path.join(root_folder, '.cache')
+
+
+def cache_key(*parts) -> str:
+    digest = hashlib.sha1()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode("utf8")
+        digest.update(b"%d:" % len(part))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+class DiskCache:
+    """Content-addressed byte store under `.cache/<name>`, shared between builds.
+
+    Entries are written atomically, so several build processes may use the same
+    cache at once. A hit refreshes the entry mtime; when the cache grows over
+    `max_size` bytes the least recently used entries are evicted.
+    """
+
+    def __init__(self, name, max_size):
+        self.folder = path.join(cache_folder, name)
+        self.max_size = max_size
+        self.enabled = True
+        self._size = None
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        entry_path = self._entry_path(key)
+        try:
+            with open(entry_path, 'rb') as f:
+                data = f.read()
+            os.utime(entry_path)
+        except OSError:
+            return None
+        return data
+
+    def put(self, key, data: bytes):
+        if not self.enabled:
+            return
+        entry_path = self._entry_path(key)
+        try:
+            os.makedirs(path.dirname(entry_path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=path.dirname(entry_path), prefix='.tmp-')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, entry_path)
+        except OSError as e:
+            print("Can't write cache entry " + entry_path + ": " + str(e))
+            return
+
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan_size()
+            else:
+                self._size += len(data)
+            if self._size > self.max_size:
+                self._evict()
+
+    def clear(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+        with self._lock:
+            self._size = 0
+
+    def _entry_path(self, key):
+        return path.join(self.folder, key[:2], key)
+
+    def _entries(self):
+        for root, dirs, files in os.walk(self.folder):
+            for file in files:
+                if file.startswith('.tmp-'):
+                    continue
+                try:
+                    stat = os.stat(path.join(root, file))
+                except OSError:
+                    continue
+                yield path.join(root, file), stat
+
+    def _scan_size(self):
+        return sum(stat.st_size for _, stat in self._entries())
+
+    def _evict(self):
+        # Drop the oldest entries until there is some headroom left, so
+        # eviction doesn't run again on the very next write
+        target = self.max_size * 0.9
+        entries = sorted(self._entries(), key=lambda entry: entry[1].st_mtime)
+        self._size = sum(stat.st_size for _, stat in entries)
+        for entry_path, stat in entries:
+            if self._size <= target:
+                break
+            try:
+                os.remove(entry_path)
+            except OSError:
+                continue
+            self._size -= stat.st_size
@@ -1,8 +1,13 @@
+import multiprocessing
+import os
+from html.parser import HTMLParser
 from bs4 import BeautifulSoup
 from os import path, walk
 
 
 dist_path = path.join(path.dirname(__file__), "../", "dist")
+# Below this number of files, classifying them costs less than starting a pool
+min_pool_urls = 2000
 
 
 def get_dist_page_content(url):
@@ -23,6 +28,50 @@ def get_dist_page_xml(url):
     return BeautifulSoup(html_content, "html.parser")
 
 
+class PageHeadParser(HTMLParser):
+    """Collects what page classification needs: refresh and robots `<meta>`
+    tags anywhere in the page, and the attributes of `<body>`."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.body_found = False
+        self.article = False
+        self.redirect = False
+        self.hidden = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'meta':
+            attrs = dict(attrs)
+            if attrs.get('http-equiv') == 'refresh':
+                self.redirect = True
+            if attrs.get('name') == 'robots' and attrs.get('content') == 'noindex':
+                self.hidden = True
+        elif tag == 'body':
+            self.body_found = True
+            self.article = self.article or any(name == 'data-article-props' for name, _ in attrs)
+
+    handle_startendtag = handle_starttag
+
+
+def get_dist_page_head(url):
+    """Parse the page without building a tree, stopping at its opening `<body>`
+    tag when no `<meta>` tag can follow it."""
+    content = get_dist_page_content(url)
+
+    lower_content = content.lower()
+    body = lower_content.find('<body')
+    # A `<body` in a comment or script before the real one only makes this check stricter
+    meta_in_body = body == -1 or lower_content.find('<meta', body) != -1
+
+    parser = PageHeadParser()
+    chunk_size = 16 * 1024
+    for start in range(0, len(content), chunk_size):
+        parser.feed(content[start:start + chunk_size])
+        if parser.body_found and not meta_in_body:
+            break
+    return parser
+
+
 def get_dist_page_type(url):
     page_type = None
 
@@ -38,7 +87,7 @@ def get_dist_page_type(url):
         if url.endswith('404.html'):
             page_type = 'Page_NotFound'
 
-        parsed = get_dist_page_xml(url)
+        head = get_dist_page_head(url)
 
         if url.startswith("/api/latest/"):
             page_type = "Page_API_stdlib" if "jvm/stdlib" in url else "Page_API_test"
@@ -46,13 +95,13 @@ def get_dist_page_type(url):
         if url.startswith("/spec/"):
             page_type = "Page_Spec"
 
-        if parsed.select_one("body[data-article-props]"):
+        if head.article:
             page_type = 'Page_Documentation'
 
-        if parsed.find("meta", {"http-equiv": "refresh"}):
+        if head.redirect:
             page_type = 'Redirect'
 
-        if parsed.find("meta", {"name": "robots", "content": "noindex"}):
+        if head.hidden:
             page_type = 'Hidden'
 
     if url.endswith('pdf'):
@@ -64,18 +113,39 @@ def get_dist_page_type(url):
     return page_type
 
 
-def get_dist_pages():
-    paths = []
-
-    if path.isdir(dist_path):
-        for root, dirnames, filenames in walk(dist_path):
+def get_dist_urls(folder=None):
+    """Generator of the urls of the files in `folder`, dist/ by default"""
+    folder = path.normpath(folder or dist_path)
+    if path.isdir(folder):
+        for root, dirnames, filenames in walk(folder):
             for filename in filenames:
-                prefix_path = root[len(dist_path):]
+                prefix_path = root[len(folder):]
                 if not prefix_path: prefix_path = "/"
 
                 url = path.join(prefix_path, filename)
 
                 if url.endswith('index.html'): url = url[:-10]
-                paths.append((url, get_dist_page_type(url)))
+                yield url
+
+
+def get_dist_url_type(url):
+    return url, get_dist_page_type(url)
+
 
-    return paths
+def iter_dist_pages(workers=None):
+    """Generator of (url, page type) of every file in dist/, classified in a pool of
+    `workers` processes, or in this one for a single worker or a small dist/."""
+    urls = list(get_dist_urls())
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(urls) < min_pool_urls:
+        for url in urls:
+            yield get_dist_url_type(url)
+        return
+
+    with multiprocessing.Pool(workers) as pool:
+        for item in pool.imap(get_dist_url_type, urls, chunksize=256):
+            yield item
+
+
+def get_dist_pages():
+    return list(iter_dist_pages())
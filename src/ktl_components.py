@@ -1,25 +1,292 @@
 import hashlib
+import json
+import os
+import select
 import subprocess
+import threading
+import time
+from contextlib import contextmanager
 from json import dumps
-from functools import lru_cache
+from os import path
 
 from flask import Markup
 from jinja2 import nodes
 from jinja2.ext import Extension
 from flask import escape
 
+from src.cache import DiskCache, cache_key, root_folder
 
-class KTLComponentExtension(Extension):
-    """ {% ktl_component "componentName" stringProp="value" boolProp %}"""
 
-    tags = frozenset(['ktl_component'])
+renderer_folder = "scripts/react-renderer"
+# Seconds a render may take before the renderer is considered hung and killed
+render_timeout = 120
+
+component_cache = DiskCache('ktl-components', 64 * 1024 * 1024)
+_bundle_hash = None
+
+
+def get_bundle_hash():
+    """Hash of everything a rendered component depends on: the renderer,
+    the components sources and the installed package versions."""
+    global _bundle_hash
+    if _bundle_hash is None:
+        files = [path.join(root_folder, 'package.json'), path.join(root_folder, 'yarn.lock')]
+        for folder in [path.join(root_folder, renderer_folder), path.join(root_folder, 'static', 'js')]:
+            for root, dirs, names in os.walk(folder):
+                dirs.sort()
+                files.extend(path.join(root, name) for name in sorted(names))
+
+        digest = hashlib.sha1()
+        for file in files:
+            if not path.isfile(file):
+                continue
+            digest.update(path.relpath(file, root_folder).encode("utf8"))
+            with open(file, 'rb') as f:
+                digest.update(hashlib.sha1(f.read()).digest())
+        _bundle_hash = digest.hexdigest()
+    return _bundle_hash
+
+
+def set_component_cache_enabled(v: bool):
+    component_cache.enabled = v
+
+
+def run_compile_process(name, props_json):
+    """Render a component with a one-off `node compile.js` process.
+
+    :return: tuple of (success, html or error output)
+    """
+    nodejs = subprocess.Popen(
+        ["node", "compile.js", name, props_json],
+        cwd=renderer_folder,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE
+    )
+
+    try:
+        stdout_data, stderr_data = nodejs.communicate(timeout=render_timeout)
+    except subprocess.TimeoutExpired:
+        nodejs.kill()
+        nodejs.communicate()
+        return False, "compile.js timed out after %d seconds" % render_timeout
+
+    if nodejs.returncode != 0:
+        return False, stderr_data.decode("utf8", errors='ignore')
+    return True, stdout_data.decode("utf8", errors='ignore')
+
+
+class NodeRendererError(Exception):
+    def __init__(self, message, timed_out=False):
+        super().__init__(message)
+        self.timed_out = timed_out
+
+
+class ComponentBatchError(Exception):
+    pass
+
+
+class NodeRenderer:
+    """Long-lived `node server.js` process rendering React components in batches.
+
+    Requests are sent as one JSON line per batch, see scripts/react-renderer/server.js.
+    The process is started on first use and restarted if it crashes; if it
+    doesn't answer within `render_timeout` seconds it is killed.
+    """
+
+    def __init__(self):
+        self.process = None
+        self._buffer = b""
+        self._lock = threading.Lock()
+        # The pipes are shared with the parent after fork, forked builds start their own process
+        os.register_at_fork(after_in_child=self._forget_process)
+
+    def render(self, name, props_json, component_type=None):
+        """:return: tuple of (success, html or error output) like `render_batch`"""
+        return self.render_batch([(name, props_json, component_type)])[0]
+
+    def render_batch(self, components):
+        """Render several components in one round trip.
+
+        :param components: list of (name, props JSON, component type) tuples
+        :return: list of (success, html or error output) tuples, in the same order
+        """
+        request = dumps([
+            {"name": name, "props": json.loads(props_json), "type": component_type}
+            for name, props_json, component_type in components
+        ])
+
+        with self._lock:
+            try:
+                results = self._exchange(request)
+            except NodeRendererError as e:
+                self._stop()
+                if e.timed_out:
+                    raise
+                # The renderer crashed or was killed, retry once with a fresh one
+                try:
+                    results = self._exchange(request)
+                except NodeRendererError:
+                    self._stop()
+                    raise
+
+        if len(results) != len(components):
+            return [(False, results[0].get("error", "")) for _ in components]
+        return [("html" in result, result.get("html", result.get("error", ""))) for result in results]
+
+    def _exchange(self, request):
+        try:
+            if self.process is None or self.process.poll() is not None:
+                self.process = subprocess.Popen(
+                    ["node", "server.js"],
+                    cwd=renderer_folder,
+                    stdin=subprocess.PIPE,
+                    stdout=subprocess.PIPE
+                )
+                self._buffer = b""
+            self.process.stdin.write(request.encode("utf8") + b"\n")
+            self.process.stdin.flush()
+            response = self._read_line(time.monotonic() + render_timeout)
+            return json.loads(response.decode("utf8"))
+        except (OSError, ValueError) as e:
+            raise NodeRendererError("ktl-components renderer died: " + str(e))
+
+    def _read_line(self, deadline):
+        # Read from the descriptor, the buffered stdout object would hide pending data from select()
+        fd = self.process.stdout.fileno()
+        while b"\n" not in self._buffer:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([fd], [], [], remaining)[0]:
+                raise NodeRendererError("ktl-components renderer didn't answer in %d seconds" % render_timeout,
+                                        timed_out=True)
+            chunk = os.read(fd, 64 * 1024)
+            if not chunk:
+                raise NodeRendererError("ktl-components renderer died: end of output")
+            self._buffer += chunk
+        line, self._buffer = self._buffer.split(b"\n", 1)
+        return line
+
+    def _stop(self):
+        if self.process is not None:
+            self.process.kill()
+            self.process.wait()
+            self.process = None
+
+    def _forget_process(self):
+        self.process = None
+        self._buffer = b""
+        self._lock = threading.Lock()
+
+
+node_renderer = NodeRenderer()
+
+_local = threading.local()
 
-    error_template = """
+error_template = """
     <pre style='font-size:14px; color:red;'>
       KTLComponentExtension FAILED!: %s
     </pre>
     """
 
+
+def get_component_key(name, props_json):
+    return cache_key(name, props_json, get_bundle_hash())
+
+
+def finish_render(key, props_json, success, output):
+    """:return: html of a rendered component, or the error template; successful renders are cached"""
+    if not success:
+        input_hash = hashlib.sha1(props_json.encode("utf8")).hexdigest()
+
+        print(
+            "##teamcity[buildProblem description='ktl-components failed! - %s'identity='%s']"
+            % (escape(output), input_hash)
+        )
+
+        return error_template % escape(output)
+
+    component_cache.put(key, output.encode("utf8"))
+    return output
+
+
+def render_component(name, props_json):
+    key = get_component_key(name, props_json)
+    cached = component_cache.get(key)
+    if cached is not None:
+        return cached.decode("utf8")
+
+    try:
+        success, output = node_renderer.render(name, props_json)
+    except NodeRendererError:
+        # Even a fresh renderer dies, a one-off process at least reports why
+        success, output = run_compile_process(name, props_json)
+    return finish_render(key, props_json, success, output)
+
+
+class ComponentBatch:
+    """Components of one template render, sent to the renderer in a single round trip.
+
+    While the template renders, uncached components are written as placeholders;
+    `substitute()` renders them all with one `render_batch()` call and puts the
+    html in their place.
+    """
+
+    def __init__(self):
+        # key -> (name, props JSON)
+        self.components = {}
+
+    def add(self, name, props_json):
+        """:return: html of the cached component, or a placeholder for it"""
+        key = get_component_key(name, props_json)
+        cached = component_cache.get(key)
+        if cached is not None:
+            return cached.decode("utf8")
+        self.components[key] = (name, props_json)
+        return self.get_placeholder(key)
+
+    @staticmethod
+    def get_placeholder(key):
+        return "<!-- ktl_component_pending: %s -->" % key
+
+    def substitute(self, html):
+        if not self.components:
+            return html
+
+        keys = list(self.components)
+        try:
+            results = node_renderer.render_batch([self.components[key] + (None,) for key in keys])
+        except NodeRendererError:
+            results = [run_compile_process(*self.components[key]) for key in keys]
+
+        for key, (success, output) in zip(keys, results):
+            placeholder = self.get_placeholder(key)
+            if placeholder not in html:
+                # Escaped or filtered on the way to the output
+                raise ComponentBatchError("ktl_component %s was rendered, but its placeholder isn't in the page"
+                                          % self.components[key][0])
+            content = finish_render(key, self.components[key][1], success, output)
+            html = html.replace(placeholder, content)
+        self.components.clear()
+        return html
+
+
+@contextmanager
+def batching_components(enabled=True):
+    """Inside the block, components rendered on this thread are collected in the
+    yielded `ComponentBatch` (None if not `enabled`) instead of being rendered one by one."""
+    previous = getattr(_local, 'batch', None)
+    _local.batch = ComponentBatch() if enabled else None
+    try:
+        yield _local.batch
+    finally:
+        _local.batch = previous
+
+
+class KTLComponentExtension(Extension):
+    """ {% ktl_component "componentName" stringProp="value" boolProp %}"""
+
+    tags = frozenset(['ktl_component'])
+
     def parse(self, parser):
         lineno = parser.stream.expect("name:ktl_component").lineno
 
@@ -35,7 +302,9 @@ class KTLComponentExtension(Extension):
         return nodes.Output([result], lineno=lineno)
 
     def _render(self, name, props):
-        content = self.__exec_render(name, dumps(props))
+        props_json = dumps(props)
+        batch = getattr(_local, 'batch', None)
+        content = batch.add(name, props_json) if batch is not None else render_component(name, props_json)
 
         props_render = dict(
             name=name,
@@ -46,29 +315,3 @@ class KTLComponentExtension(Extension):
             "<!-- ktl_component: %s -->%s"
             % (dumps(props_render), content)
         )
-
-    @lru_cache(maxsize=None)
-    def __exec_render(self, name, props_json):
-        nodejs = subprocess.Popen(
-            ["node", "compile.js", name, props_json],
-            cwd="scripts/react-renderer",
-            stdin=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
-        )
-
-        stdout_data, stderr_data = nodejs.communicate()
-
-        if nodejs.returncode != 0:
-            input_hash = hashlib.sha1(props_json.encode("utf8")).hexdigest()
-
-            print(
-                "##teamcity[buildProblem description='ktl-components failed! - %s'identity='%s']"
-                % (escape(stderr_data), input_hash)
-            )
-
-            result = self.error_template % escape(stderr_data)
-        else:
-            result = stdout_data.decode("utf8", errors='ignore')
-
-        return result
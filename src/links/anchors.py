@@ -0,0 +1,36 @@
+def get_anchors(parsed_html):
+    """Ids of the headers and names of the anchors a fragment link may point to."""
+    anchors = set()
+    for element in parsed_html.find_all(['h1', 'h2', 'h3', 'h4']):
+        if element.has_attr('id'):
+            anchors.add(element['id'])
+    for element in parsed_html.find_all('a'):
+        if element.has_attr('name'):
+            anchors.add(element['name'])
+    return frozenset(anchors)
+
+
+class AnchorIndex:
+    """Page path to the frozenset of its anchors, computed once per page and
+    shared by all the links pointing to it.
+
+    Entries remember the page object they were computed from, so a page
+    reloaded by FLATPAGES_AUTO_RELOAD is indexed again.
+    """
+
+    def __init__(self, pages):
+        self.pages = pages
+        self._anchors = {}
+
+    def get(self, page_path):
+        page = self.pages.get(page_path)
+        if page is None:
+            return None
+
+        cached = self._anchors.get(page_path)
+        if cached is not None and cached[0] is page:
+            return cached[1]
+
+        anchors = get_anchors(page.parsed_html)
+        self._anchors[page_path] = (page, anchors)
+        return anchors
@@ -0,0 +1,145 @@
+import json
+import multiprocessing
+import os
+from html.parser import HTMLParser
+from os import path
+from urllib.parse import unquote, urljoin, urlparse
+
+
+class LinkCollector(HTMLParser):
+    """Single pass over a page collecting its anchors and the hrefs of its links."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.anchors = set()
+        self.hrefs = []
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if attrs.get('id'):
+            self.anchors.add(attrs['id'])
+        if tag == 'a':
+            if attrs.get('name'):
+                self.anchors.add(attrs['name'])
+            if attrs.get('href'):
+                self.hrefs.append(attrs['href'])
+
+
+def file_url(relative_path):
+    return '/' + relative_path.replace(os.sep, '/')
+
+
+def scan_file(file):
+    """:return: tuple of (file url, anchors, hrefs) of the html `file`, given as (root, relative path)"""
+    root, relative_path = file
+    collector = LinkCollector()
+    with open(path.join(root, relative_path), 'r', encoding="UTF-8", errors='replace') as f:
+        for chunk in iter(lambda: f.read(64 * 1024), ''):
+            collector.feed(chunk)
+    collector.close()
+    return file_url(relative_path), frozenset(collector.anchors), collector.hrefs
+
+
+# Checker shared with the forked workers, set up by LinkChecker.run()
+_checker = None
+
+
+def check_file(file):
+    """Scan the html `file` and resolve its links against the files of the shared checker.
+
+    :return: tuple of (file url, anchors, number of checked links, errors,
+        (href, target url, fragment) of the resolved links with a fragment)
+    """
+    url, anchors, hrefs = scan_file(file)
+    checked_links = 0
+    errors = []
+    fragment_links = []
+    for href in hrefs:
+        link = urlparse(urljoin(url, href))
+        if link.scheme != '' or link.netloc != '':
+            continue
+        checked_links += 1
+
+        target = _checker.resolve(unquote(link.path))
+        if target is None:
+            errors.append({'type': 'broken_link', 'page': url, 'href': href})
+        elif link.fragment != '':
+            fragment_links.append((href, target, unquote(link.fragment)))
+    return url, anchors, checked_links, errors, fragment_links
+
+
+class LinkChecker:
+    """Checks internal links and fragments of a frozen site.
+
+    Every html file under the `roots` (merged, as they would be served at '/')
+    is parsed once in a pool of `workers` processes, which also resolve its
+    links against the index of existing files. Only the anchors of every page
+    and the links with a fragment into a page not scanned yet are kept.
+    """
+
+    def __init__(self, roots, workers):
+        self.roots = roots
+        self.workers = workers
+        self.files = set()
+        self.anchors = {}
+        self.checked_links = 0
+        self.errors = []
+
+    def run(self):
+        html_files = []
+        for root in self.roots:
+            for folder, dirs, files in os.walk(root):
+                for file in files:
+                    relative_path = path.relpath(path.join(folder, file), root)
+                    url = file_url(relative_path)
+                    if url in self.files:
+                        continue
+                    self.files.add(url)
+                    if file.endswith('.html'):
+                        html_files.append((root, relative_path))
+
+        global _checker
+        _checker = self
+        html_urls = set(file_url(relative_path) for root, relative_path in html_files)
+        # target url -> [(page url, href, fragment)] waiting for the anchors of the target
+        pending = {}
+        with multiprocessing.get_context('fork').Pool(self.workers) as pool:
+            for url, anchors, checked_links, errors, fragment_links in \
+                    pool.imap_unordered(check_file, html_files, chunksize=64):
+                self.anchors[url] = anchors
+                self.checked_links += checked_links
+                self.errors.extend(errors)
+                for href, target, fragment in fragment_links:
+                    if target in self.anchors:
+                        self.check_fragment(url, href, target, fragment)
+                    elif target in html_urls:
+                        pending.setdefault(target, []).append((url, href, fragment))
+                    # else a link into a file that isn't html
+                for page_url, href, fragment in pending.pop(url, ()):
+                    self.check_fragment(page_url, href, url, fragment)
+
+        return self.errors
+
+    def check_fragment(self, page_url, href, target, fragment):
+        if fragment not in self.anchors[target]:
+            self.errors.append({'type': 'bad_anchor', 'page': page_url, 'href': href})
+
+    def resolve(self, url_path):
+        """:return: url of the file serving `url_path`, or None"""
+        if url_path.endswith('/'):
+            url_path += 'index.html'
+        if url_path in self.files:
+            return url_path
+        if url_path + '/index.html' in self.files:
+            return url_path + '/index.html'
+        return None
+
+    def write_report(self, report_path):
+        with open(report_path, 'w', encoding="UTF-8") as f:
+            json.dump({
+                'roots': self.roots,
+                'files': len(self.files),
+                'pages': len(self.anchors),
+                'links': self.checked_links,
+                'errors': sorted(self.errors, key=lambda error: (error['page'], error['href'])),
+            }, f, indent=2)
@@ -0,0 +1,62 @@
+from os import path
+from urllib.parse import urlparse
+
+from werkzeug.exceptions import MethodNotAllowed, NotFound
+from werkzeug.routing import RequestRedirect
+from werkzeug.security import safe_join
+
+
+class LinkResolver:
+    """Tells whether a site url exists by matching it against the route table
+    and checking the file behind it, instead of rendering it.
+
+    Endpoints serving files register how to find them with `register_file()`,
+    `register_directory()` or `register()`; urls of other endpoints are passed
+    to the `fallback` function. With `memoize` (for builds, where files don't
+    come and go) results are memoized per url path.
+    """
+
+    def __init__(self, url_adapter, fallback, memoize=False):
+        self.url_adapter = url_adapter
+        self.fallback = fallback
+        self.memoize = memoize
+        self._resolvers = {}
+        self._exists = {}
+
+    def register(self, endpoint, resolve):
+        """:param resolve: function of the url params returning the served file path, or None"""
+        self._resolvers[endpoint] = resolve
+
+    def register_file(self, endpoint, file_path):
+        self.register(endpoint, lambda params: file_path)
+
+    def register_directory(self, endpoint, folder, param='path'):
+        self.register(endpoint, lambda params: safe_join(folder, params[param]))
+
+    def exists(self, url_path):
+        if not self.memoize:
+            return self._resolve(url_path)
+        result = self._exists.get(url_path)
+        if result is None:
+            result = self._resolve(url_path)
+            self._exists[url_path] = result
+        return result
+
+    def clear(self):
+        self._exists.clear()
+
+    def _resolve(self, url_path):
+        try:
+            endpoint, params = self.url_adapter.match(url_path, 'GET', query_args={})
+        except RequestRedirect as e:
+            # strict slashes, e.g. '/docs' -> '/docs/'
+            return self.exists(urlparse(e.new_url).path)
+        except (NotFound, MethodNotAllowed):
+            return False
+
+        resolve = self._resolvers.get(endpoint)
+        if resolve is None:
+            return self.fallback(url_path)
+
+        file_path = resolve(params)
+        return file_path is not None and path.isfile(file_path)
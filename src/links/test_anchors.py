@@ -0,0 +1,48 @@
+import unittest
+
+from bs4 import BeautifulSoup
+
+from src.links.anchors import AnchorIndex, get_anchors
+
+
+class Page:
+    def __init__(self, html):
+        self.html = html
+        self.parsed = 0
+
+    @property
+    def parsed_html(self):
+        self.parsed += 1
+        return BeautifulSoup(self.html, 'html.parser')
+
+
+class AnchorIndexTest(unittest.TestCase):
+    html = '<h1 id="title">Title</h1><h2 id="usage">Usage</h2><h5 id="deep">Deep</h5>' \
+           '<a name="legacy"></a><a href="#usage">link</a><p id="paragraph"></p>'
+
+    def test_get_anchors(self):
+        self.assertEqual(frozenset({'title', 'usage', 'legacy'}),
+                         get_anchors(BeautifulSoup(self.html, 'html.parser')))
+
+    def test_computed_once(self):
+        page = Page(self.html)
+        index = AnchorIndex({'docs/page': page})
+        self.assertEqual(frozenset({'title', 'usage', 'legacy'}), index.get('docs/page'))
+        self.assertIs(index.get('docs/page'), index.get('docs/page'))
+        self.assertEqual(1, page.parsed)
+
+    def test_missing_page(self):
+        self.assertIsNone(AnchorIndex({}).get('docs/missing'))
+
+    def test_reloaded_page(self):
+        pages = {'docs/page': Page(self.html)}
+        index = AnchorIndex(pages)
+        index.get('docs/page')
+
+        # FLATPAGES_AUTO_RELOAD replaces the page object of a changed file
+        pages['docs/page'] = Page('<h2 id="renamed">Renamed</h2>')
+        self.assertEqual(frozenset({'renamed'}), index.get('docs/page'))
+
+
+if __name__ == '__main__':
+    unittest.main()
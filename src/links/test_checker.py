@@ -0,0 +1,64 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from os import path
+
+from src.links.checker import LinkChecker
+
+
+class LinkCheckerTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+        self.build = path.join(self.folder, 'build')
+        self.dist = path.join(self.folder, 'dist')
+
+    def write(self, root, name, content):
+        file_path = path.join(root, *name.split('/'))
+        os.makedirs(path.dirname(file_path), exist_ok=True)
+        with open(file_path, 'w', encoding="UTF-8") as f:
+            f.write(content)
+
+    def check(self, workers=2):
+        checker = LinkChecker([self.build, self.dist], workers)
+        errors = sorted(checker.run(), key=lambda error: (error['page'], error['href']))
+        return checker, errors
+
+    def test_links(self):
+        self.write(self.build, 'index.html',
+                   '<a href="docs/">docs</a> <a href="docs/page.html#usage">usage</a> '
+                   '<a href="https://example.com/missing.html">external</a> <a href="/assets/logo.svg">logo</a> '
+                   '<a href="/docs">no slash</a> <a href="/missing.html">missing</a>')
+        self.write(self.build, 'assets/logo.svg', '<svg/>')
+        self.write(self.dist, 'docs/index.html', '<h1 id="docs">Docs</h1><a href="../index.html#top">top</a>')
+        self.write(self.dist, 'docs/page.html', '<h2 id="usage">Usage</h2><a name="legacy"></a>'
+                                                '<a href="#legacy">legacy</a> <a href="#missing">missing</a>')
+
+        checker, errors = self.check()
+        self.assertEqual([
+            {'type': 'bad_anchor', 'page': '/docs/index.html', 'href': '../index.html#top'},
+            {'type': 'bad_anchor', 'page': '/docs/page.html', 'href': '#missing'},
+            {'type': 'broken_link', 'page': '/index.html', 'href': '/missing.html'},
+        ], errors)
+        # The external link is not checked
+        self.assertEqual(8, checker.checked_links)
+        self.assertEqual(frozenset({'usage', 'legacy'}), checker.anchors['/docs/page.html'])
+
+        report = path.join(self.folder, 'report.json')
+        checker.write_report(report)
+        with open(report, encoding="UTF-8") as f:
+            self.assertEqual(errors, json.load(f)['errors'])
+
+    def test_first_root_wins(self):
+        self.write(self.build, 'page.html', '<h2 id="built">Built</h2>')
+        self.write(self.dist, 'page.html', '<h2 id="dist">Dist</h2>')
+        self.write(self.dist, 'other.html', '<a href="page.html#built">built</a> <a href="page.html#dist">dist</a>')
+
+        checker, errors = self.check(1)
+        self.assertEqual([{'type': 'bad_anchor', 'page': '/other.html', 'href': 'page.html#dist'}], errors)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import os
+import shutil
+import tempfile
+import unittest
+from os import path
+
+from werkzeug.routing import Map, Rule
+
+from src.links.resolver import LinkResolver
+
+
+class LinkResolverTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+        os.makedirs(path.join(self.folder, 'docs'))
+        self.write('docs/home.html')
+        self.write('reference.pdf')
+
+        url_map = Map([
+            Rule('/docs/<path:path>', endpoint='docs'),
+            Rule('/docs/reference.pdf', endpoint='pdf'),
+            Rule('/community/', endpoint='community'),
+            Rule('/<path:page_path>.html', endpoint='page'),
+        ])
+        self.fallback_urls = []
+        self.resolver = LinkResolver(url_map.bind('localhost'), self.fallback)
+        self.resolver.register_directory('docs', path.join(self.folder, 'docs'))
+        self.resolver.register_file('pdf', path.join(self.folder, 'reference.pdf'))
+        self.resolver.register('community', lambda params: None)
+
+    def write(self, name):
+        with open(path.join(self.folder, name), 'w', encoding="UTF-8") as f:
+            f.write(name)
+
+    def fallback(self, url_path):
+        self.fallback_urls.append(url_path)
+        return url_path == '/page.html'
+
+    def test_files(self):
+        self.assertTrue(self.resolver.exists('/docs/home.html'))
+        self.assertFalse(self.resolver.exists('/docs/missing.html'))
+        self.assertTrue(self.resolver.exists('/docs/reference.pdf'))
+        self.assertFalse(self.resolver.exists('/community/'))
+        # Out of the registered folder
+        self.assertFalse(self.resolver.exists('/docs/../reference.pdf'))
+        self.assertEqual([], self.fallback_urls)
+
+    def test_routes(self):
+        self.assertTrue(self.resolver.exists('/page.html'))
+        self.assertFalse(self.resolver.exists('/other.html'))
+        self.assertEqual(['/page.html', '/other.html'], self.fallback_urls)
+        # No route
+        self.assertFalse(self.resolver.exists('/missing'))
+        # Redirected to the url with a slash
+        self.resolver.register('community', lambda params: path.join(self.folder, 'docs', 'home.html'))
+        self.assertTrue(self.resolver.exists('/community'))
+
+    def test_memoize(self):
+        self.assertFalse(self.resolver.exists('/docs/new.html'))
+        self.write('docs/new.html')
+        # Not memoized by default, as the dev server sees files come and go
+        self.assertTrue(self.resolver.exists('/docs/new.html'))
+
+        self.resolver.memoize = True
+        self.resolver.exists('/page.html')
+        self.resolver.exists('/page.html')
+        self.assertEqual(['/page.html'], self.fallback_urls)
+        self.assertTrue(self.resolver.exists('/docs/new.html'))
+        os.remove(path.join(self.folder, 'docs', 'new.html'))
+        self.assertTrue(self.resolver.exists('/docs/new.html'))
+        self.resolver.clear()
+        self.assertFalse(self.resolver.exists('/docs/new.html'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,162 @@
+import atexit
+import os
+import queue
+import subprocess
+import threading
+
+kramdown_command = "kramdown --input GFM --no-hard-wrap --smart-quotes apos,apos,quot,quot --no-enable-coderay"
+worker_script = os.path.join(os.path.dirname(__file__), "kramdown_worker.rb")
+
+
+def run_kramdown_process(text_utf8):
+    """Convert the text with a one-off `kramdown` process.
+
+    :return: tuple of (returncode, stdout bytes, stderr bytes)
+    """
+    kramdown = subprocess.Popen(
+        kramdown_command,
+        shell=True,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE
+    )
+    stdout_data, stderr_data = kramdown.communicate(input=text_utf8)
+    return kramdown.returncode, stdout_data, stderr_data
+
+
+class KramdownWorkerError(Exception):
+    pass
+
+
+class KramdownWorker:
+    """A Ruby process running kramdown_worker.rb, converting one page at a time."""
+
+    def __init__(self):
+        self.process = subprocess.Popen(
+            ["ruby", worker_script],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE
+        )
+        self.converted = 0
+
+    def convert(self, text_utf8):
+        try:
+            self.process.stdin.write(b"%d\n" % len(text_utf8))
+            self.process.stdin.write(text_utf8)
+            self.process.stdin.flush()
+
+            header = self.process.stdout.readline()
+            returncode, html_length, stderr_length = (int(x) for x in header.split())
+            stdout_data = self._read_exactly(html_length)
+            stderr_data = self._read_exactly(stderr_length)
+        except (OSError, ValueError) as e:
+            raise KramdownWorkerError("kramdown worker died: " + str(e))
+
+        self.converted += 1
+        return returncode, stdout_data, stderr_data
+
+    def _read_exactly(self, size):
+        data = self.process.stdout.read(size)
+        if len(data) != size:
+            raise KramdownWorkerError("kramdown worker closed its output")
+        return data
+
+    def close(self):
+        try:
+            self.process.stdin.close()
+            self.process.wait(timeout=5)
+        except (OSError, subprocess.TimeoutExpired):
+            self.process.kill()
+
+
+class KramdownPool:
+    """Long-lived kramdown workers reused across pages.
+
+    Workers are started lazily, up to `size` of them, so a single-threaded
+    build only ever starts one Ruby interpreter. With `size` 0 every call
+    runs a one-off `kramdown` process, like before the pool existed.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._started = 0
+        self._lock = threading.Lock()
+        atexit.register(self.close)
+        # Worker pipes are shared with the parent after fork, a forked build
+        # process has to start its own workers
+        os.register_at_fork(after_in_child=self._forget_workers)
+
+    def convert(self, text_utf8):
+        """:return: tuple of (returncode, stdout bytes, stderr bytes)"""
+        worker = self._acquire()
+        if worker is None:
+            return run_kramdown_process(text_utf8)
+
+        try:
+            result = worker.convert(text_utf8)
+        except KramdownWorkerError as e:
+            # Drop the broken worker, a fresh one is started on demand
+            self._discard(worker)
+            if worker.converted == 0:
+                self._disable(e)
+            return run_kramdown_process(text_utf8)
+
+        self._idle.put(worker)
+        return result
+
+    def resize(self, size):
+        self.size = size
+        self.close()
+
+    def close(self):
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(worker)
+
+    def _acquire(self):
+        while self.size > 0:
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                pass
+
+            with self._lock:
+                can_start = self._started < self.size
+                if can_start:
+                    self._started += 1
+
+            if can_start:
+                try:
+                    return KramdownWorker()
+                except OSError as e:
+                    with self._lock:
+                        self._started -= 1
+                    self._disable(e)
+                    return None
+
+            try:
+                return self._idle.get(timeout=1)
+            except queue.Empty:
+                continue
+
+        return None
+
+    def _forget_workers(self):
+        self._idle = queue.LifoQueue()
+        self._started = 0
+        self._lock = threading.Lock()
+
+    def _disable(self, reason):
+        # The worker can't even start (no ruby, no kramdown gem), stop trying
+        print("Disabling kramdown workers: " + str(reason))
+        self.size = 0
+        self.close()
+
+    def _discard(self, worker):
+        worker.close()
+        with self._lock:
+            self._started -= 1
@@ -0,0 +1,48 @@
+# Long-lived kramdown converter, driven by src/markdown/kramdown_pool.py.
+#
+# It reads framed requests from stdin and writes framed responses to stdout
+# until stdin is closed:
+#
+#   request:  "<markdown length>\n<markdown bytes>"
+#   response: "<exit code> <html length> <stderr length>\n<html bytes><stderr bytes>"
+#
+# Exit code and stderr mimic what the `kramdown` command line tool would
+# report for the same input, so the caller can keep a single error path.
+#
+# it is expected to have kramdown version 1.14.0 (see makrdown.py)
+
+require 'kramdown'
+
+OPTIONS = {
+  'input' => 'GFM',
+  'hard_wrap' => 'false',
+  'smart_quotes' => 'apos,apos,quot,quot',
+  'enable_coderay' => 'false'
+}.freeze
+
+$stdin.binmode
+$stdout.binmode
+$stdout.sync = true
+
+def convert(source)
+  doc = Kramdown::Document.new(source, OPTIONS)
+  html = doc.to_html
+  warnings = doc.warnings.map { |warning| "Warning: #{warning}\n" }.join
+  [0, html, warnings]
+rescue StandardError => e
+  [1, '', "Error: #{e.message}\n"]
+end
+
+while (header = $stdin.gets)
+  length = Integer(header.strip)
+  source = length.zero? ? '' : $stdin.read(length)
+  break if source.nil? || source.bytesize != length
+
+  code, html, errors = convert(source.force_encoding('UTF-8'))
+  html = html.b
+  errors = errors.b
+
+  $stdout.write("#{code} #{html.bytesize} #{errors.bytesize}\n")
+  $stdout.write(html)
+  $stdout.write(errors)
+end
@@ -1,11 +1,29 @@
-import subprocess
 import hashlib
 import re
 import os
 
+from src.build import profiler
+from src.build.dependencies import record_input
+from src.cache import DiskCache, cache_key
+from src.ktl_components import batching_components
+from src.markdown.kramdown_pool import KramdownPool, kramdown_command
+
 root_folder = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
 include_regex = re.compile("^\\s*\\[\\[\\s*(import|include)\\s+([^\\]]+)\\s*\\]\\]\\s*$", re.MULTILINE)
 
+kramdown_pool = KramdownPool(os.cpu_count() or 1)
+
+
+render_cache = DiskCache('markdown', 512 * 1024 * 1024)
+
+
+def set_kramdown_workers(size: int):
+    kramdown_pool.resize(size)
+
+
+def set_render_cache_enabled(v: bool):
+    render_cache.enabled = v
+
 
 def handle_match(m):
     include_file: str = m.group(2).strip()
@@ -17,6 +35,7 @@ def handle_match(m):
                         ", only 'externals/', 'pages-includes/', or 'pages/' are allowed")
 
     include_path = os.path.join(root_folder, include_file)
+    record_input('includes', include_path)
 
     with open(include_path, 'r', encoding="UTF-8") as f:
         include_text = f.read()
@@ -33,18 +52,18 @@ def customized_markdown(text):
     # it is expected to have kramdown version 1.14.0
     # the kramdown version 2.1.0  misses the --no-hard-wrap flag
 
-    kramdown = subprocess.Popen(
-        "kramdown --input GFM --no-hard-wrap --smart-quotes apos,apos,quot,quot --no-enable-coderay",
-        shell=True,
-        stdin=subprocess.PIPE,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE
-    )
     text_utf8 = text.encode("utf8")
-    stdout_data, stderr_data = kramdown.communicate(input=text_utf8)
+
+    # text is already post-Jinja and post-include, so it fully determines the output
+    key = cache_key(kramdown_command, text_utf8)
+    cached_html = render_cache.get(key)
+    if cached_html is not None:
+        return cached_html.decode("utf8")
+
+    returncode, stdout_data, stderr_data = kramdown_pool.convert(text_utf8)
     html = stdout_data.decode("utf8", errors='ignore')
 
-    if kramdown.returncode != 0:
+    if returncode != 0:
         input_hash = hashlib.sha1(text_utf8).hexdigest()
         print(" ##teamcity[buildProblem description='kramdown failed!' identity='%s'] " % input_hash)
         html = "<pre style='font-size:14px; color:red;'><![CDATA[\n" \
@@ -52,17 +71,23 @@ def customized_markdown(text):
                  stderr_data.decode("utf8", errors='ignore') + \
                "]]></pre>\n\n" + \
                html
+    else:
+        render_cache.put(key, html.encode("utf8"))
 
     return html
 
 
 def jinja_aware_markdown(text, flatPages):
 
-    text = include_contents_from_files(text)
+    with profiler.stage('include'):
+        text = include_contents_from_files(text)
     app = flatPages.app
     template_context = {}
     app.update_template_context(template_context)
 
     env = app.jinja_env
-    template = env.from_string(text)
-    return customized_markdown(template.render(template_context))
+    # The result goes through kramdown, so components are rendered in place rather than as placeholders
+    with profiler.stage('jinja'), batching_components(False):
+        text = env.from_string(text).render(template_context)
+    with profiler.stage('kramdown'):
+        return customized_markdown(text)
@@ -0,0 +1,131 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from src.build.dependencies import get_fingerprint, recording_dependencies, unstable_window
+
+
+class PageCache:
+    """LRU cache of rendered pages for the dev server, bounded to `max_size` characters.
+
+    A page is stored with the input files recorded while rendering it (source,
+    includes, templates, data files and linked pages, see `src.build.dependencies`).
+    A watcher thread polls those files every `poll_interval` seconds and drops
+    the pages depending on a file that changed, then tells the listeners added
+    with `add_listener()` (e.g. to reload data files). Files added with
+    `watch_files()` are watched whether a cached page depends on them or not.
+    """
+
+    def __init__(self, max_size, poll_interval=1.0):
+        self.max_size = max_size
+        self.poll_interval = poll_interval
+        self.enabled = False
+        self.size = 0
+        # key -> (value, files)
+        self._entries = OrderedDict()
+        # file -> [fingerprint, keys of the pages depending on it]
+        self._watched = {}
+        # file -> fingerprint, of the files watched for the listeners
+        self._files = {}
+        self._lock = threading.Lock()
+        self._watcher_pid = None
+        self._listeners = []
+
+    def add_listener(self, callback):
+        """`callback` gets the list of changed files, called from the watcher thread"""
+        self._listeners.append(callback)
+
+    def watch_files(self, files):
+        """Tell the listeners about changes of `files` even when no cached page depends on them"""
+        with self._lock:
+            for file in files:
+                self._files[file] = get_fingerprint(file)
+
+    def render(self, key, render):
+        """:return: cached value for `key`, or the result of `render()`, cached"""
+        if not self.enabled:
+            return render()
+
+        if self._watcher_pid != os.getpid():
+            # After a fork the watcher of the parent process is gone
+            self._watcher_pid = os.getpid()
+            threading.Thread(target=self._watch, name='page-cache-watcher', daemon=True).start()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry[0]
+
+        start = time.time_ns()
+        with recording_dependencies(fingerprints=True) as dependencies:
+            value = render()
+
+        fingerprints = dependencies.fingerprints
+        unstable = any(fingerprint is not None and fingerprint[0] >= start - unstable_window
+                       for fingerprint in fingerprints.values())
+        if fingerprints and not unstable and isinstance(value, str):
+            self._put(key, value, fingerprints)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._watched.clear()
+            self.size = 0
+
+    def _put(self, key, value, fingerprints):
+        files = set(fingerprints)
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (value, files)
+            self.size += len(value)
+            for file, fingerprint in fingerprints.items():
+                watched = self._watched.setdefault(file, [fingerprint, set()])
+                watched[1].add(key)
+            while self.size > self.max_size and len(self._entries) > 1:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        value, files = entry
+        self.size -= len(value)
+        for file in files:
+            watched = self._watched.get(file)
+            if watched is None:
+                continue
+            watched[1].discard(key)
+            if not watched[1]:
+                del self._watched[file]
+
+    def _watch(self):
+        while True:
+            time.sleep(self.poll_interval)
+            with self._lock:
+                watched = {file: item[0] for file, item in self._watched.items()}
+                files = dict(self._files)
+
+            changed = [file for file, fingerprint in watched.items() if get_fingerprint(file) != fingerprint]
+            for file, fingerprint in files.items():
+                current = get_fingerprint(file)
+                if current != fingerprint:
+                    if file not in watched:
+                        changed.append(file)
+                    with self._lock:
+                        self._files[file] = current
+            if not changed:
+                continue
+
+            with self._lock:
+                for file in changed:
+                    item = self._watched.get(file)
+                    if item is None:
+                        continue
+                    for key in list(item[1]):
+                        self._remove(key)
+
+            for listener in self._listeners:
+                listener(changed)
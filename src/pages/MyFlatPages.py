@@ -6,6 +6,10 @@ from src.pages.MyPage import MyPage
 
 
 class MyFlatPages(FlatPages):
+    default_config = FlatPages.default_config + (
+        ('html_parser', 'html.parser'),
+    )
+
     def _parse(self, content, path):
         """Parse a flatpage file, i.e. read and parse its meta data and body.
 
@@ -28,4 +32,4 @@ class MyFlatPages(FlatPages):
         html_renderer = self._smart_html_renderer(html_renderer)
 
         # Initialize and return Page instance
-        return MyPage(path, meta, content, html_renderer)
\ No newline at end of file
+        return MyPage(path, meta, content, html_renderer, self.config('html_parser'))
@@ -2,21 +2,49 @@ from bs4 import BeautifulSoup
 from flask_flatpages import Page
 from werkzeug.utils import cached_property
 
+from src.build import profiler
 from src.processors.processors import process_markdown_html
 
 
+def get_fragment(tree):
+    """lxml wraps the fragment in a document, with its leading <script>, <style>
+    and <link> elements moved to <head>: put them back in front of the body content.
+
+    :return: the <body> holding the whole fragment
+    """
+    body = tree.body
+    if body is None:
+        body = tree.new_tag('body')
+        (tree.html or tree).append(body)
+    if tree.head is not None:
+        for element in reversed(list(tree.head.contents)):
+            body.insert(0, element.extract())
+    return body
+
+
 class MyPage(Page):
+    def __init__(self, path, meta, body, html_renderer, html_parser='html.parser'):
+        super().__init__(path, meta, body, html_renderer)
+        #: BeautifulSoup tree builder, 'html.parser' or 'lxml'
+        self.html_parser = html_parser
+
     @cached_property
     def unprocessed_html(self):
         return self.html_renderer(self)
 
     @cached_property
     def parsed_html(self):
-        return process_markdown_html(BeautifulSoup(self.unprocessed_html, 'html.parser'))
+        unprocessed_html = self.unprocessed_html
+        with profiler.stage('parse'):
+            tree = BeautifulSoup(unprocessed_html, self.html_parser)
+        if self.html_parser != 'html.parser':
+            tree = get_fragment(tree)
+        with profiler.stage('process_html'):
+            return process_markdown_html(tree)
 
     @cached_property
     def html(self):
         """The content of the page, rendered as HTML by the configured
         renderer.
         """
-        return str(self.parsed_html).replace("<br>", "<br/>")
+        return self.parsed_html.decode_contents() if self.parsed_html.name == 'body' else str(self.parsed_html)
@@ -0,0 +1,190 @@
+from html import escape
+from html.parser import HTMLParser
+
+from src.processors import processors
+from src.processors.processors import generate_header_id
+
+void_elements = frozenset([
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input',
+    'link', 'meta', 'param', 'source', 'track', 'wbr',
+])
+
+header_tags = frozenset(['h1', 'h2', 'h3'])
+
+
+def format_start_tag(tag, attrs, self_closing=False):
+    parts = [tag]
+    for name, value in attrs:
+        parts.append(name if value is None else '%s="%s"' % (name, escape(value, quote=True)))
+    return '<%s%s>' % (' '.join(parts), '/' if self_closing else '')
+
+
+class ApiHtmlTransformer(HTMLParser):
+    """Streaming equivalent of `process_code_blocks` followed by `process_header_ids`.
+
+    Markup is copied through as it is read; only the start tags of annotated
+    code blocks and of headers without an id are rewritten. Header content is
+    held back until the header closes, since its id comes from its text.
+    End tags are balanced the way the BeautifulSoup tree is: an end tag closes
+    the elements left open inside it, stray end tags are dropped and elements
+    still open at the end are closed.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.output = []
+        # (tag, attrs) of the open elements
+        self.stack = []
+        self.renamed = []
+        # [tag, attrs, depth, buffered output, text] of the open headers waiting for their id
+        self.headers = []
+
+    def transform(self, html):
+        self.feed(html)
+        self.close()
+        return ''.join(self.output)
+
+    def emit(self, text):
+        if self.headers:
+            self.headers[-1][3].append(text)
+        else:
+            self.output.append(text)
+
+    def emit_text(self, raw, text):
+        for header in self.headers:
+            header[4].append(text)
+        self.emit(raw)
+
+    def handle_starttag(self, tag, attrs):
+        raw = self.get_starttag_text()
+        self.start_element(tag, attrs, raw)
+        if tag not in void_elements:
+            self.stack.append((tag, attrs))
+
+    def handle_startendtag(self, tag, attrs):
+        self.start_element(tag, attrs, self.get_starttag_text(), self_closing=True)
+
+    def start_element(self, tag, attrs, raw, self_closing=False):
+        if tag == 'code':
+            attrs, raw = self.process_code(attrs, raw, self_closing)
+            if attrs is not None:
+                tag = 'span'
+
+        if tag in header_tags and not any(name == 'id' for name, _ in attrs):
+            if self_closing:
+                # An empty header
+                self.emit(format_start_tag(tag, attrs + [('id', generate_header_id(''))]) + '</%s>' % tag)
+            else:
+                self.headers.append([tag, attrs, len(self.stack), [], []])
+            return
+
+        self.emit(raw)
+
+    def process_code(self, attrs, raw, self_closing):
+        """:return: tuple of (attrs, raw) if the element is renamed to span, or (None, raw)"""
+        if processors.replace_simple_code and len(attrs) == 0:
+            # some spellcheckers may not know what to do with <code> elements,
+            # we replace in-line code blocks with span to improve spellcheckers
+            attrs = [('style', "font-style: italic; text-decoration: underline;")]
+            if not self_closing:
+                self.renamed.append(len(self.stack))
+            return attrs, format_start_tag('span', attrs, self_closing)
+
+        if not self.stack or self.stack[-1][0] != 'pre':
+            return None, raw
+
+        lang = None
+        for name, value in attrs:
+            if name == 'class' and value is not None:
+                for class_name in value.split():
+                    if class_name.startswith("language-"):
+                        lang = class_name[len("language-"):]
+        if lang is None:
+            return None, raw
+
+        for tag, parent_attrs in reversed(self.stack):
+            if tag == 'div':
+                # Skip executable samples
+                classes = ' '.join(value or '' for name, value in parent_attrs if name == 'class').split()
+                if "sample" in classes:
+                    return None, raw
+                break
+
+        code_attrs = [(name, "code _highlighted" if name == 'class' else value) for name, value in attrs
+                      if name != 'data-lang']
+        code_attrs.append(('data-lang', processors.languageMimeTypeMap[lang]))
+        return None, format_start_tag('code', code_attrs, self_closing)
+
+    def handle_endtag(self, tag):
+        for index in range(len(self.stack) - 1, -1, -1):
+            if self.stack[index][0] == tag:
+                self.close_elements(index)
+                return
+        # A stray end tag, which isn't a part of the tree
+
+    def close_elements(self, depth):
+        """Close the open elements down to the one at `depth`, innermost first"""
+        for index in range(len(self.stack) - 1, depth - 1, -1):
+            tag = self.stack[index][0]
+            if tag == 'code' and self.renamed and self.renamed[-1] == index:
+                self.renamed.pop()
+                self.emit('</span>')
+            else:
+                self.emit('</%s>' % tag)
+            del self.stack[index]
+
+            if self.headers and self.headers[-1][2] == index:
+                self.flush_header()
+
+    def flush_header(self):
+        tag, attrs, depth, buffered, text = self.headers.pop()
+        attrs = attrs + [('id', generate_header_id(''.join(text)))]
+        # Into the enclosing header, if it is waiting for its id too
+        target = self.headers[-1][3] if self.headers else self.output
+        target.append(format_start_tag(tag, attrs))
+        target.extend(buffered)
+
+    def handle_data(self, data):
+        # Character references come decoded, escape the text again except in <script>/<style>
+        self.emit_text(data if self.cdata_elem else escape(data, quote=False), data)
+
+    def handle_comment(self, data):
+        self.emit('<!--%s-->' % data)
+
+    def handle_decl(self, decl):
+        self.emit('<!%s>' % decl)
+
+    def handle_pi(self, data):
+        self.emit('<?%s>' % data)
+
+    def unknown_decl(self, data):
+        self.emit('<![%s]>' % data)
+
+    def close(self):
+        super().close()
+        self.close_elements(0)
+
+
+def process_api_html(html):
+    return ApiHtmlTransformer().transform(html)
+
+
+if __name__ == '__main__':
+    # python -m src.processors.api_html api/latest/jvm/stdlib/kotlin/index.html ...
+    import sys
+    import timeit
+
+    from bs4 import BeautifulSoup
+
+    from src.processors.processors import process_code_blocks, process_header_ids
+
+    def process_with_soup(html):
+        html_content = BeautifulSoup(html, 'html.parser')
+        return str(process_header_ids(process_code_blocks(html_content)))
+
+    for file_path in sys.argv[1:]:
+        with open(file_path) as html_file:
+            html = html_file.read()
+        soup_time = min(timeit.repeat(lambda: process_with_soup(html), number=5, repeat=3)) / 5
+        streaming_time = min(timeit.repeat(lambda: process_api_html(html), number=5, repeat=3)) / 5
+        print("%s: BeautifulSoup %.1f ms, streaming %.1f ms" % (file_path, soup_time * 1000, streaming_time * 1000))
@@ -1,5 +1,7 @@
 import re
 
+from bs4.element import PreformattedString, Tag
+
 replace_simple_code = False
 
 languageMimeTypeMap = {
@@ -57,18 +59,66 @@ processors = {
 
 
 def process_markdown_html(tree):
-    tree = process_code_blocks(tree)
-
-    for element in tree.select('*'):
-        appendClass = processors.get(element.name)
-        if appendClass is not None:
-            if element.has_attr('class'):
-                element['class'].append(processors.get(element.name))
-            else:
-                element['class'] = processors.get(element.name)
+    """Post-process the kramdown output of a flat page in a single walk over the tree:
+    the same changes as `process_code_blocks`, the `typo-*` classes from `processors`,
+    and `<br>` written as `<br/>` in the text that is serialized as is
+    (comments, CDATA, scripts and styles; tags are written as `<br/>` anyway).
+    """
+    # (element, its closest div including itself)
+    pending = [(tree, None)]
+    while pending:
+        element, closest_div = pending.pop()
+        for child in list(element.children):
+            if isinstance(child, Tag):
+                process_markdown_element(child, element, closest_div)
+                pending.append((child, child if child.name == 'div' else closest_div))
+            elif "<br>" in child and is_serialized_as_is(child, element):
+                child.replace_with(type(child)(child.replace("<br>", "<br/>")))
 
     return tree
 
+
+def is_serialized_as_is(string, parent):
+    """True for the strings BeautifulSoup writes without escaping: comments, CDATA
+    and the like, and the content of <script> and <style>. Other text, including
+    the `TemplateString`s of <template>, is escaped, so it never contains `<br>`."""
+    return isinstance(string, PreformattedString) or parent.name in ('script', 'style')
+
+
+def process_markdown_element(element, parent, closest_div):
+    if element.name == 'code':
+        if replace_simple_code and len(element.attrs) == 0:
+            element.name = "span"
+            element['style'] = "font-style: italic; text-decoration: underline;"
+        elif parent.name == 'pre':
+            process_code_block(element, closest_div)
+
+    append_class = processors.get(element.name)
+    if append_class is not None:
+        if element.has_attr('class'):
+            element['class'].append(append_class)
+        else:
+            element['class'] = append_class
+
+
+def process_code_block(element, parent_div):
+    class_names = element.get("class")
+    lang = None
+    if class_names is not None:
+        for class_name in class_names:
+            if class_name.startswith("language-"):
+                lang = class_name[len("language-"):]
+
+    if lang is None:
+        return
+
+    # Skip executable samples
+    if parent_div is not None and parent_div.has_attr('class') and "sample" in parent_div['class']:
+        return
+    element['data-lang'] = languageMimeTypeMap[lang]
+    element['class'] = "code _highlighted"
+
+
 def process_code_blocks(tree):
     if replace_simple_code:
         # some spellcheckers may not know what to do with <code> elements,
@@ -80,34 +130,23 @@ def process_code_blocks(tree):
                 element['style'] = "font-style: italic; text-decoration: underline;"
 
     for element in tree.select('pre > code'):
-        class_names = element.get("class")
-        lang = None
-        if class_names is not None:
-            for class_name in class_names:
-                if class_name.startswith("language-"):
-                    lang = class_name[len("language-"):]
-
-        if lang is None:
-            continue
-
-        parent_div = find_closest_tag(element, 'div')
-        # Skip executable samples
-        if parent_div is not None and parent_div.has_attr('class') and "sample" in parent_div['class']:
-            continue
-        element['data-lang'] = languageMimeTypeMap[lang]
-        element['class'] = "code _highlighted"
+        process_code_block(element, find_closest_tag(element, 'div'))
 
     return tree
 
 
+def generate_header_id(text):
+    generated_id = re.sub(r'[^a-zA-Z0-9 \\-]', '', text)
+    generated_id = generated_id.replace(' ', '-')
+    generated_id = generated_id.lower()
+    generated_id = generated_id.strip()
+    return generated_id
+
+
 def process_header_ids(tree):
     header_elements = tree.select('h1,h2,h3')
     for header in header_elements:
         if header.get("id") is not None:
             continue
-        generated_id = re.sub(r'[^a-zA-Z0-9 \\-]', '', header.text)
-        generated_id = generated_id.replace(' ', '-')
-        generated_id = generated_id.lower()
-        generated_id = generated_id.strip()
-        header['id'] = generated_id
+        header['id'] = generate_header_id(header.text)
     return tree
@@ -0,0 +1,81 @@
+import unittest
+from html.parser import HTMLParser
+
+from bs4 import BeautifulSoup
+
+from src.processors.api_html import process_api_html, void_elements
+from src.processors.processors import process_code_blocks, process_header_ids, set_replace_simple_code
+
+
+def process_with_soup(html):
+    return str(process_header_ids(process_code_blocks(BeautifulSoup(html, 'html.parser'))))
+
+
+class TokenCollector(HTMLParser):
+    """Tokens of a document, ignoring the serialization differences of BeautifulSoup
+    (`<br/>` for `<br>`, attribute order)."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.tokens = []
+
+    def handle_starttag(self, tag, attrs):
+        self.tokens.append(('start', tag, sorted(attrs)))
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in void_elements:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag not in void_elements:
+            self.tokens.append(('end', tag))
+
+    def handle_data(self, data):
+        if self.tokens and self.tokens[-1][0] == 'data':
+            self.tokens[-1] = ('data', self.tokens[-1][1] + data)
+        else:
+            self.tokens.append(('data', data))
+
+
+def tokenize(html):
+    collector = TokenCollector()
+    collector.feed(html)
+    collector.close()
+    return collector.tokens
+
+
+class ApiHtmlTransformerTest(unittest.TestCase):
+    def assertSameAsSoup(self, html):
+        self.assertEqual(tokenize(process_with_soup(html)), tokenize(process_api_html(html)), html)
+
+    def test_headers(self):
+        self.assertSameAsSoup('<h1>Title</h1><h2 id="given">Given</h2><h3>A <b>bold</b> header</h3><h4>Skipped</h4>')
+
+    def test_nested_headers(self):
+        self.assertSameAsSoup('<h1>Outer<h2>Inner</h2></h1>')
+        self.assertSameAsSoup('<h1>Outer<h2 id="x">Given<h3>Deep</h3></h2> tail</h1><p>after</p>')
+
+    def test_unclosed_headers(self):
+        self.assertSameAsSoup('<div><h2>Unclosed <span>header</div><p>next</p>')
+        self.assertSameAsSoup('<h1>Open at the end<h2>Inner')
+        self.assertSameAsSoup('<h2/><h3 class="empty"/>')
+
+    def test_stray_end_tags(self):
+        self.assertSameAsSoup('</div><h2>Title</span></h2></p><br></br><p>text</p></h3>')
+
+    def test_code_blocks(self):
+        self.assertSameAsSoup('<pre><code class="language-kotlin">val a = 1 &lt; 2</code></pre>'
+                              '<div class="sample"><pre><code class="language-kotlin">fun main()</code></pre></div>'
+                              '<h2>With <code>code</code> &amp; entities</h2>')
+
+    def test_editable_code(self):
+        set_replace_simple_code(True)
+        try:
+            self.assertSameAsSoup('<p><code>inline<div>unclosed</code> text</p><h2><code>code</code> header</h2>')
+        finally:
+            set_replace_simple_code(False)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,229 @@
+import hashlib
+import mmap
+import os
+import struct
+import threading
+from collections.abc import Mapping
+from os import path
+
+from ruamel.yaml import YAML
+
+from src.build.dependencies import record_input
+from src.cache import cache_folder
+
+root_folder = path.dirname(path.dirname(__file__))
+redirects_folder = path.join(root_folder, 'redirects')
+index_file = path.join(cache_folder, 'redirects.idx')
+
+# Index layout, all integers little-endian:
+#   magic, sha1 stamp of the source files, number of records
+#   offsets of the records, sorted by the UTF-8 bytes of their source url, then by file number
+#   records: uint16 source length, uint16 target length, uint16 file number, source, target
+# A url redirected by several files has a record for each of them.
+index_magic = b'KRI2'
+header = struct.Struct('<4s20sI')
+offset = struct.Struct('<I')
+record = struct.Struct('<HHH')
+
+redirect_html = """<noscript><meta http-equiv="refresh" content="0; url={url}"/></noscript>
+<script>window.location = '{url}' + window.location.hash;</script>
+<meta http-equiv="refresh" content="1; url={url}"/>
+"""
+
+
+def get_redirect_files(folder=redirects_folder):
+    return sorted(path.join(folder, file) for file in os.listdir(folder) if file.endswith('.yml'))
+
+
+def get_stamp(files):
+    digest = hashlib.sha1()
+    for file_path in files:
+        stat = os.stat(file_path)
+        digest.update(('%s:%d:%d\n' % (path.abspath(file_path), stat.st_mtime_ns, stat.st_size)).encode("utf8"))
+    return digest.digest()
+
+
+def read_redirects(files):
+    """:return: dict of (source url, file number) to target url; later entries of a file override earlier ones"""
+    yaml = YAML(typ='safe')
+    redirects = {}
+    for number, file_path in enumerate(files):
+        with open(file_path, encoding="UTF-8") as f:
+            entries = yaml.load(f) or []
+        for entry in entries:
+            sources = entry["from"] if isinstance(entry["from"], list) else [entry["from"]]
+            for source in sources:
+                redirects[(source, number)] = entry["to"]
+    return redirects
+
+
+def compile_redirects(files, index_path=index_file):
+    """Write the redirects of `files` into a binary index at `index_path`."""
+    items = sorted((source.encode("utf8"), number, target.encode("utf8"))
+                   for (source, number), target in read_redirects(files).items())
+
+    records_start = header.size + offset.size * len(items)
+    offsets = []
+    records = []
+    position = records_start
+    for source, number, target in items:
+        offsets.append(offset.pack(position))
+        records.append(record.pack(len(source), len(target), number) + source + target)
+        position += record.size + len(source) + len(target)
+
+    os.makedirs(path.dirname(index_path), exist_ok=True)
+    tmp_file = index_path + '.' + str(os.getpid())
+    with open(tmp_file, 'wb') as f:
+        f.write(header.pack(index_magic, get_stamp(files), len(items)))
+        f.write(b''.join(offsets))
+        f.write(b''.join(records))
+    os.replace(tmp_file, index_path)
+    return len(items)
+
+
+class RedirectIndex(Mapping):
+    """Read-only mapping of source url to target url over the compiled redirect index.
+
+    The index file is memory-mapped, lookups are a binary search over it, so
+    nothing is loaded up front and the pages are shared between processes.
+    The index is compiled from all `files`, the mapping only covers the
+    `selected` ones (all by default), later files overriding earlier ones.
+    A lookup records the file the redirect came from as a data dependency,
+    or the selected files when there is none.
+    """
+
+    def __init__(self, files, index_path=index_file, selected=None):
+        self.files = files
+        self.index_path = index_path
+        self.selected = set(range(len(files))) if selected is None else \
+            {files.index(file_path) for file_path in selected}
+        self._data = None
+        self._count = 0
+        self._length = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Map the index, compiling it first if the redirect files changed since."""
+        with self._lock:
+            if self._data is not None:
+                return
+            stamp = get_stamp(self.files)
+            data = self._open()
+            if data is None or header.unpack_from(data)[:2] != (index_magic, stamp):
+                if data is not None:
+                    data.close()
+                compile_redirects(self.files, self.index_path)
+                data = self._open()
+            self._count = header.unpack_from(data)[2]
+            self._data = data
+
+    def _open(self):
+        try:
+            with open(self.index_path, 'rb') as f:
+                if os.fstat(f.fileno()).st_size < header.size:
+                    return None
+                return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except OSError:
+            return None
+
+    def _record(self, index):
+        position = offset.unpack_from(self._data, header.size + offset.size * index)[0]
+        source_length, target_length, number = record.unpack_from(self._data, position)
+        source_start = position + record.size
+        target_start = source_start + source_length
+        return self._data[source_start:target_start], number, self._data[target_start:target_start + target_length]
+
+    def _records(self):
+        """:return: iterator of (source, file number, target) of the selected redirects, by source"""
+        self.load()
+        found = None
+        for index in range(self._count):
+            source, number, target = self._record(index)
+            if found is not None and found[0] != source:
+                yield found
+                found = None
+            if number in self.selected:
+                found = source, number, target
+        if found is not None:
+            yield found
+
+    def lookup(self, source):
+        """:return: target url of the `source` url, or None"""
+        self.load()
+        key = source.encode("utf8")
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self._record(middle)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+
+        found = None
+        while low < self._count:
+            record_source, number, target = self._record(low)
+            if record_source != key:
+                break
+            if number in self.selected:
+                found = number, target
+            low += 1
+
+        if found is None:
+            for number in self.selected:
+                record_input('data', self.files[number])
+            return None
+        record_input('data', self.files[found[0]])
+        return found[1].decode("utf8")
+
+    def __getitem__(self, source):
+        target = self.lookup(source) if isinstance(source, str) else None
+        if target is None:
+            raise KeyError(source)
+        return target
+
+    def __contains__(self, source):
+        return isinstance(source, str) and self.lookup(source) is not None
+
+    def __len__(self):
+        if self._length is None:
+            self._length = sum(1 for _ in self._records())
+        return self._length
+
+    def __iter__(self):
+        for source, number, target in self._records():
+            yield source.decode("utf8")
+
+    def items(self):
+        for source, number, target in self._records():
+            yield source.decode("utf8"), target.decode("utf8")
+
+
+def redirect_file_path(url, out_folder):
+    url_path = url[1:] if url.startswith('/') else url
+    if not url_path.endswith('.html'):
+        url_path = path.join(url_path, 'index.html')
+    return path.join(out_folder, *url_path.split('/'))
+
+
+def generate_redirect_pages(redirects, out_folder):
+    """Write a redirect page for every redirect of the index into `out_folder`,
+    keeping the pages that already exist there.
+
+    :return: tuple of (created, skipped) counts
+    """
+    created = 0
+    skipped = 0
+    folders = set()
+    for source, target in redirects.items():
+        file_path = redirect_file_path(source, out_folder)
+        if path.exists(file_path):
+            skipped += 1
+            continue
+        folder = path.dirname(file_path)
+        if folder not in folders:
+            os.makedirs(folder, exist_ok=True)
+            folders.add(folder)
+        with open(file_path, 'w', encoding="UTF-8") as f:
+            f.write(redirect_html.format(url=target))
+        created += 1
+    return created, skipped
@@ -0,0 +1,178 @@
+import hashlib
+import json
+import multiprocessing
+import os
+from os import path
+
+from src.cache import cache_folder
+from src.dist import dist_path, get_dist_urls
+from src.search.records import get_page_records, get_page_views, is_skipped, load_page_views, make_search_item
+
+records_file = path.join(cache_folder, 'search-records.jsonl')
+# Records of the local search index, exported independently of the pushed ones
+local_records_file = path.join(cache_folder, 'search-index-records.jsonl')
+
+# Exported folder, page hashes of the previous export and page views, shared with the forked workers
+_folder = dist_path
+_previous_hashes = {}
+_page_views = {}
+
+
+class RecordStore:
+    """Search records of every page, one JSON line per page:
+    `{"url": ..., "hash": <sha1 of the page file>, "type": ..., "records": [...]}`,
+    records as pushed to the index, see `make_search_item()`."""
+
+    def __init__(self, file_path=records_file):
+        self.file_path = file_path
+        self.pages = {}
+
+    def load(self):
+        self.pages = {}
+        try:
+            with open(self.file_path, encoding="UTF-8") as f:
+                for line in f:
+                    if line.strip():
+                        page = json.loads(line)
+                        self.pages[page['url']] = page
+        except OSError:
+            pass
+        return self
+
+    def save(self):
+        os.makedirs(path.dirname(path.abspath(self.file_path)), exist_ok=True)
+        tmp_file = self.file_path + '.' + str(os.getpid())
+        with open(tmp_file, 'w', encoding="UTF-8") as f:
+            for url in sorted(self.pages):
+                f.write(json.dumps(self.pages[url], ensure_ascii=False, sort_keys=True) + '\n')
+        os.replace(tmp_file, self.file_path)
+
+    def records(self):
+        for url in sorted(self.pages):
+            for record in self.pages[url]['records']:
+                yield record
+
+
+def is_page_url(url):
+    """Whether the file at `url` is read by scripts/dist/analyzer for search records"""
+    return (url.endswith('/') or url.endswith('.html')) and not is_skipped(url[1:])
+
+
+def get_page_file(url):
+    return _folder + url + ('index.html' if url.endswith('/') else '')
+
+
+def extract_page(url):
+    """:return: tuple of (url, content hash, page type, records), type and records are None if the page didn't change"""
+    with open(get_page_file(url), 'rb') as f:
+        content = f.read()
+    content_hash = hashlib.sha1(content).hexdigest()
+    if _previous_hashes.get(url) == content_hash:
+        return url, content_hash, None, None
+    page_type, records = get_page_records(url, content.decode("UTF-8", errors='replace'))
+    return url, content_hash, page_type, [make_search_item(url, record, _page_views) for record in records]
+
+
+def diff_records(previous, current):
+    """:return: dict of added and changed records, and removed object ids"""
+    previous_records = {record['objectID']: record for record in previous}
+    current_records = {record['objectID']: record for record in current}
+    return {
+        'added': [record for object_id, record in current_records.items() if object_id not in previous_records],
+        'changed': [record for object_id, record in current_records.items()
+                    if object_id in previous_records and previous_records[object_id] != record],
+        'removed': sorted(object_id for object_id in previous_records if object_id not in current_records),
+    }
+
+
+def seed_delta(delta, object_ids):
+    """The delta of a first export against the records already in the index, by their `object_ids`:
+    existing records are changed, the ones not exported anymore are removed."""
+    if object_ids is None:
+        return delta
+    object_ids = set(object_ids)
+    records = delta['added'] + delta['changed']
+    exported = set(record['objectID'] for record in records)
+    return {
+        'added': [record for record in records if record['objectID'] not in object_ids],
+        'changed': [record for record in records if record['objectID'] in object_ids],
+        'removed': sorted(object_ids - exported),
+    }
+
+
+def export_records(store, workers=None, folder=None):
+    """Extract the search records of the pages in `folder` (dist/ by default) into `store`,
+    parsing only the pages whose content hash changed since the previous export.
+    The views of unchanged pages are updated from the current statistics.
+
+    :return: delta against the previous export, see `diff_records()`
+    """
+    global _folder, _previous_hashes, _page_views
+    _folder = path.normpath(folder or dist_path)
+    _previous_hashes = {url: page['hash'] for url, page in store.pages.items()}
+    _page_views = load_page_views()
+
+    previous = store.pages
+    pages = {}
+    urls = [url for url in get_dist_urls(_folder) if is_page_url(url)]
+    with multiprocessing.get_context('fork').Pool(workers) as pool:
+        for url, content_hash, page_type, records in pool.imap_unordered(extract_page, urls, chunksize=32):
+            if records is None:
+                page_type = previous[url].get('type')
+                records = [dict(record, pageViews=get_page_views(_page_views, url))
+                           for record in previous[url]['records']]
+            pages[url] = {'url': url, 'hash': content_hash, 'type': page_type, 'records': records}
+
+    delta = diff_records(
+        [record for page in previous.values() for record in page['records']],
+        [record for page in pages.values() for record in page['records']],
+    )
+    store.pages = pages
+    return delta
+
+
+class SearchBackend:
+    """Where the delta is pushed to; the base class only reports it."""
+
+    def object_ids(self):
+        """:return: object ids of the records in the index, None if unknown"""
+        return None
+
+    def save_objects(self, records):
+        print("Search: %d records to save" % len(records))
+
+    def delete_objects(self, object_ids):
+        print("Search: %d records to delete" % len(object_ids))
+
+
+class AlgoliaBackend(SearchBackend):
+    def __init__(self, app_id, api_key, index_name):
+        from algoliasearch.client import Client
+
+        self.index = Client(app_id, api_key).init_index(index_name)
+
+    def object_ids(self):
+        return [hit['objectID'] for hit in self.index.browse_all({'attributesToRetrieve': ['objectID']})]
+
+    def save_objects(self, records):
+        if records:
+            self.index.save_objects(records)
+
+    def delete_objects(self, object_ids):
+        if object_ids:
+            self.index.delete_objects(object_ids)
+
+
+def get_search_backend():
+    """Algolia with the credentials scripts/dist uses, None if they are not set"""
+    app_id = os.environ.get('WH_SEARCH_USER')
+    api_key = os.environ.get('WH_SEARCH_WRITE_KEY')
+    index_name = os.environ.get('ALGOLIA_INDEX_NAME')
+    if app_id and api_key and index_name:
+        return AlgoliaBackend(app_id, api_key, index_name)
+    return None
+
+
+def push_delta(backend, delta):
+    backend.save_objects(delta['added'] + delta['changed'])
+    backend.delete_objects(delta['removed'])
@@ -0,0 +1,164 @@
+import re
+
+import soupsieve
+from bs4 import BeautifulSoup
+from bs4.element import NavigableString, PageElement, PreformattedString, Tag
+
+# Port of scripts/dist/lib/html.ts over BeautifulSoup, for the search record parsers
+
+
+def load_html(html):
+    """Parse a page; attribute values stay strings, as in cheerio"""
+    return BeautifulSoup(html, 'html.parser', multi_valued_attributes=None)
+
+
+def is_text(node):
+    # Comments, doctypes and CDATA (a comment in HTML) have no text content
+    return isinstance(node, NavigableString) and not isinstance(node, PreformattedString)
+
+
+def get_text(node):
+    """:return: text of `node`, as `$(node).text()`"""
+    if node is None:
+        return ''
+    if isinstance(node, NavigableString):
+        return str(node) if is_text(node) else ''
+    return ''.join(str(string) for string in node.descendants if is_text(string))
+
+
+def matches(node, selector):
+    """:return: whether `node` is an element matching `selector`, as `$(node).is(selector)`"""
+    return isinstance(node, Tag) and soupsieve.match(selector, node)
+
+
+def find(roots, selector):
+    """:return: elements under `roots` matching `selector`, as `$(roots).find(selector)`;
+    `:scope` is each of the roots"""
+    found = []
+    seen = set()
+    for root in roots:
+        for node in root.select(selector):
+            if id(node) not in seen:
+                seen.add(id(node))
+                found.append(node)
+    return found
+
+
+def remove(nodes):
+    for node in nodes:
+        node.extract()
+
+
+def find_next_element_with(node, test):
+    node = node.next_sibling
+    while node is not None:
+        if isinstance(node, Tag) and test(node):
+            return node
+        node = node.next_sibling
+    return None
+
+
+def find_prev_element_with(node, test):
+    node = node.previous_sibling
+    while node is not None:
+        if isinstance(node, Tag) and test(node):
+            return node
+        node = node.previous_sibling
+    return None
+
+
+def next_element(node):
+    return find_next_element_with(node, lambda element: True)
+
+
+def parse_fragment(html):
+    return list(load_html(html).contents)
+
+
+def get_attrs_string(node):
+    return ' '.join('%s="%s"' % (key, '' if value is None else value) for key, value in node.attrs.items())
+
+
+def replace_node(roots, selector, make):
+    """Replace the elements matching `selector` with the markup `make(node, attrs, content)` returns, if any"""
+    for node in find(roots, selector):
+        markup = make(node, get_attrs_string(node), node.decode_contents())
+        if markup:
+            node.replace_with(*parse_fragment(markup))
+
+
+def clean_text(text):
+    return text.replace('\n', ' ').strip()
+
+
+def html_to_text(nodes, is_final_node=None):
+    """Text of `nodes` and their following siblings, with markup hints for search records:
+    inline code in backticks, bold in asterisks, list items as bullets, images by their alt text.
+
+    Nodes are walked depth first from the end of `nodes`; the walk stops at the first
+    node (or text) for which `is_final_node(node, level)` is true.
+    """
+    stack = [(node, 0) for node in nodes]
+    content = []
+
+    while stack:
+        node, level = stack.pop()
+
+        # Empty texts of elements without content are dropped too
+        if node is None or (not isinstance(node, PageElement) and not node):
+            continue
+        if is_final_node is not None and is_final_node(node, level):
+            break
+
+        if not isinstance(node, PageElement):
+            content.append(node)
+            continue
+
+        if not is_text(node) and not isinstance(node, Tag):
+            continue
+
+        result = [node]
+
+        if isinstance(node, Tag):
+            tag = node.name.lower()
+
+            if tag in ('script', 'style', 'th'):
+                continue
+
+            if tag == 'code':
+                text = get_text(node).strip()
+                if '\n' not in text:
+                    content.append('`' + clean_text(text) + '`')
+                    stack.append((node.next_sibling, level))
+                    continue
+
+            if tag == 'li':
+                result = ['\n  • ', node]
+
+            if tag in ('strong', 'b'):
+                result = ['*', node, '*']
+
+            if tag == 'img':
+                text = node.get('alt') or node.get('title')
+                result = ['&lt;see %s&gt;' % text if text else '&lt;image&gt;']
+
+        if isinstance(node, Tag) and node.contents:
+            result = [(node.contents[0], level + 1) if item is node else item for item in result]
+
+        stack.append((node.next_sibling, level))
+        for item in reversed(result):
+            if isinstance(item, tuple):
+                stack.append(item)
+            elif isinstance(item, PageElement):
+                stack.append((clean_text(get_text(node)), level))
+            else:
+                stack.append((item, level))
+
+    text = ' '.join(content)
+    text = text.replace('//sampleStart', '').replace('//sampleEnd', '')
+    text = re.sub(r'[^\S\r\n]+', ' ', text)
+    text = re.sub(r' ([;)])', r'\1', text)
+    text = re.sub(r' ([,?!:]( |\Z))', r'\1', text)
+    text = re.sub(r'( \.{3} )|( (\.( |\Z)))', r'\1\3', text)
+    text = re.sub(r'([(]) ', r'\1', text)
+    return text.strip()
@@ -0,0 +1,289 @@
+import bisect
+import json
+import mmap
+import os
+import pickle
+import re
+import struct
+import sys
+import threading
+from array import array
+from os import path
+
+from src.cache import cache_folder
+
+index_file = path.join(cache_folder, 'search-index.bin')
+tokens_file = path.join(cache_folder, 'search-tokens.pickle')
+
+# Index layout, all integers little-endian and 4-byte aligned:
+#   header: magic, number of documents, terms, postings and top postings
+#   documents: (offset, length) of the JSON of every record in the blob
+#   terms: (offset, length) of the term in the blob, (first, count) of its
+#       postings, (first, count) of its top postings; sorted by term
+#   posting documents, sorted by document for every term
+#   posting weights, in the same order
+#   top postings: positions of the postings of a term with the highest weights
+#   blob: UTF-8 of the terms and the JSON of the documents
+index_magic = b'KSI2'
+header = struct.Struct('<4sIIII')
+document_entry = struct.Struct('<II')
+term_entry = struct.Struct('<IIIIII')
+
+field_weights = (('mainTitle', 8), ('pageTitle', 6), ('headings', 3), ('content', 1))
+# Fields of a record returned by queries
+result_fields = ('objectID', 'url', 'mainTitle', 'pageTitle', 'headings')
+max_prefix_terms = 64
+top_postings = 128
+# A query word with more postings than this only brings the top postings of its terms as candidates
+max_candidate_postings = 2048
+candidates_per_result = 4
+
+token_pattern = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text):
+    return [token.lower() for token in token_pattern.findall(text or '')]
+
+
+def get_record_terms(record):
+    """:return: dict of term to weight in the record"""
+    terms = {}
+    for field, weight in field_weights:
+        for token in tokenize(record.get(field)):
+            terms[token] = terms.get(token, 0) + weight
+    return terms
+
+
+def load_token_cache():
+    try:
+        with open(tokens_file, 'rb') as f:
+            return pickle.load(f)
+    except (OSError, EOFError, ValueError, pickle.UnpicklingError):
+        return {}
+
+
+def build_search_index(store, index_path=index_file):
+    """Write the inverted index of the records of `store` (a `RecordStore`) to `index_path`.
+
+    The terms of every page are kept in `.cache/search-tokens.pickle` with its
+    content hash, only pages that changed since the previous build are tokenized.
+
+    :return: tuple of (documents, terms, pages tokenized)
+    """
+    cached = load_token_cache()
+    page_tokens = {}
+    tokenized = 0
+    for url, page in store.pages.items():
+        entry = cached.get(url)
+        if entry is None or entry[0] != page['hash']:
+            entry = (page['hash'], [get_record_terms(record) for record in page['records']])
+            tokenized += 1
+        page_tokens[url] = entry
+
+    documents = []
+    postings = {}
+    for url in sorted(store.pages):
+        for record, terms in zip(store.pages[url]['records'], page_tokens[url][1]):
+            document = len(documents)
+            documents.append(json.dumps({field: record.get(field) for field in result_fields},
+                                        ensure_ascii=False).encode("utf8"))
+            for term, weight in terms.items():
+                postings.setdefault(term, []).append((document, weight))
+
+    blob = bytearray()
+    document_table = bytearray()
+    for document in documents:
+        document_table += document_entry.pack(len(blob), len(document))
+        blob += document
+
+    term_table = bytearray()
+    posting_documents = array('I')
+    posting_weights = array('I')
+    top = array('I')
+    for term_utf8, term in sorted((term.encode("utf8"), term) for term in postings):
+        term_postings = postings[term]
+        first = len(posting_documents)
+        best = sorted(range(len(term_postings)), key=lambda i: -term_postings[i][1])[:top_postings]
+        term_table += term_entry.pack(len(blob), len(term_utf8), first, len(term_postings), len(top), len(best))
+        blob += term_utf8
+        for document, weight in term_postings:
+            posting_documents.append(document)
+            posting_weights.append(weight)
+        top.extend(first + i for i in best)
+
+    for table in (posting_documents, posting_weights, top):
+        if sys.byteorder != 'little':
+            table.byteswap()
+
+    os.makedirs(path.dirname(index_path), exist_ok=True)
+    tmp_file = index_path + '.' + str(os.getpid())
+    with open(tmp_file, 'wb') as f:
+        f.write(header.pack(index_magic, len(documents), len(term_table) // term_entry.size,
+                            len(posting_documents), len(top)))
+        f.write(document_table)
+        f.write(term_table)
+        f.write(posting_documents.tobytes())
+        f.write(posting_weights.tobytes())
+        f.write(top.tobytes())
+        f.write(blob)
+    os.replace(tmp_file, index_path)
+
+    tmp_file = tokens_file + '.' + str(os.getpid())
+    with open(tmp_file, 'wb') as f:
+        pickle.dump(page_tokens, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_file, tokens_file)
+
+    return len(documents), len(term_table) // term_entry.size, tokenized
+
+
+class IndexFile:
+    """Reader over the mapped bytes of an index written by `build_search_index()`.
+
+    Postings are read in place through memoryviews, nothing is loaded up front.
+    A query takes its candidates from the rarest word and looks the other
+    words up in the document-sorted postings with a binary search.
+    """
+
+    def __init__(self, data):
+        self.data = data
+        magic, self.document_count, self.term_count, posting_count, top_count = header.unpack_from(data)
+        if magic != index_magic or sys.byteorder != 'little':
+            raise ValueError("Not a search index")
+        self.documents_start = header.size
+        self.terms_start = self.documents_start + document_entry.size * self.document_count
+        postings_start = self.terms_start + term_entry.size * self.term_count
+        weights_start = postings_start + 4 * posting_count
+        top_start = weights_start + 4 * posting_count
+        self.blob_start = top_start + 4 * top_count
+
+        view = memoryview(data)
+        self.posting_documents = view[postings_start:weights_start].cast('I')
+        self.posting_weights = view[weights_start:top_start].cast('I')
+        self.top = view[top_start:self.blob_start].cast('I')
+
+    def __len__(self):
+        return self.term_count
+
+    def __getitem__(self, position):
+        # The sequence of the UTF-8 terms, for bisect
+        return self.get_term(position)[0]
+
+    def get_term(self, position):
+        """:return: tuple of (term, first posting, posting count, first top posting, top posting count)"""
+        offset, length, first, count, top_first, top_count = \
+            term_entry.unpack_from(self.data, self.terms_start + term_entry.size * position)
+        start = self.blob_start + offset
+        return self.data[start:start + length], first, count, top_first, top_count
+
+    def get_document(self, document):
+        offset, length = document_entry.unpack_from(self.data, self.documents_start + document_entry.size * document)
+        start = self.blob_start + offset
+        return json.loads(self.data[start:start + length].decode("utf8"))
+
+    def find_terms(self, prefix):
+        """:return: list of (factor, first, count, top first, top count) of the terms starting with `prefix`"""
+        prefix_utf8 = prefix.encode("utf8")
+        first_position = bisect.bisect_left(self, prefix_utf8)
+        terms = []
+        for position in range(first_position, min(first_position + max_prefix_terms, self.term_count)):
+            term, first, count, top_first, top_count = self.get_term(position)
+            if not term.startswith(prefix_utf8):
+                break
+            # Exact matches rank above longer terms sharing the prefix
+            factor = 2 if term == prefix_utf8 else 1
+            terms.append((factor, first, count, top_first, top_count))
+        return terms
+
+    def collect(self, terms):
+        """:return: dict of document to score from the postings of `terms`,
+        only from their top postings if there are too many"""
+        documents = self.posting_documents
+        weights = self.posting_weights
+        use_top = sum(term[2] for term in terms) > max_candidate_postings
+        scores = {}
+        for factor, first, count, top_first, top_count in terms:
+            if use_top:
+                positions = self.top[top_first:top_first + top_count]
+            else:
+                positions = range(first, first + count)
+            for position in positions:
+                document = documents[position]
+                score = weights[position] * factor
+                if score > scores.get(document, 0):
+                    scores[document] = score
+        return scores
+
+    def score(self, document, terms):
+        """:return: best score of `document` among the postings of `terms`, or 0"""
+        documents = self.posting_documents
+        best = 0
+        for factor, first, count, _, _ in terms:
+            position = bisect.bisect_left(documents, document, first, first + count)
+            if position < first + count and documents[position] == document:
+                best = max(best, self.posting_weights[position] * factor)
+        return best
+
+    def search(self, tokens, limit):
+        """:return: list of (document, score) matching every token as a prefix, best first"""
+        token_terms = [self.find_terms(token) for token in tokens]
+        if not all(token_terms):
+            return []
+
+        token_terms.sort(key=lambda terms: sum(term[2] for term in terms))
+        scores = self.collect(token_terms[0])
+        for terms in token_terms[1:]:
+            # Best candidates first; once there are enough matches the weaker ones are not checked
+            matched = {}
+            for document, score in sorted(scores.items(), key=lambda item: -item[1]):
+                term_score = self.score(document, terms)
+                if term_score:
+                    matched[document] = score + term_score
+                    if len(matched) >= limit * candidates_per_result:
+                        break
+            scores = matched
+            if not scores:
+                return []
+
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]
+
+
+class SearchIndex:
+    """Memory-mapped index written by `build_search_index()`, mapped again
+    when a newer build replaces the file."""
+
+    def __init__(self, index_path=index_file):
+        self.index_path = index_path
+        self.stamp = None
+        self.file = None
+        self._lock = threading.Lock()
+
+    def open(self):
+        """:return: the current `IndexFile`, or None if there is no index"""
+        try:
+            stat = os.stat(self.index_path)
+        except OSError:
+            return None
+        stamp = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        with self._lock:
+            if stamp != self.stamp:
+                try:
+                    with open(self.index_path, 'rb') as f:
+                        self.file = IndexFile(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+                except (OSError, ValueError, struct.error):
+                    self.file = None
+                self.stamp = stamp
+            return self.file
+
+    def search(self, query, limit=20):
+        """:return: up to `limit` records matching every word of `query` as a prefix, best first"""
+        tokens = tokenize(query)
+        index = self.open() if tokens else None
+        if index is None:
+            return []
+
+        results = []
+        for document, score in index.search(tokens, limit):
+            result = index.get_document(document)
+            result['score'] = score
+            results.append(result)
+        return results
@@ -0,0 +1,436 @@
+import math
+import os
+import posixpath
+import re
+from urllib.parse import urljoin, urlsplit
+
+from src.search.html import find, find_next_element_with, find_prev_element_with, get_text, html_to_text, \
+    load_html, matches, next_element, remove, replace_node
+
+# Ports of the parsers of scripts/dist/lib/search/parsers: the same page gives the same records
+
+site_url = 'https://kotlinlang.org'
+
+default_record = {
+    'content': '',
+    'type': 'Documentation',
+    'parent': None,
+    'pageViews': 0,
+    'product': 'help/kotlin-reference',
+}
+
+
+def make_record(**fields):
+    record = dict(default_record)
+    record.update(fields)
+    return record
+
+
+def get_page_url(soup, url):
+    """URL of the page from its og:url, the canonical one otherwise"""
+    meta = soup.select_one('meta[property="og:url"]')
+    return meta['content'] if meta is not None and meta.get('content') else site_url + '/' + url
+
+
+# Writerside documentation, parsers/writerside.ts
+
+title_selector = '[id]:is(h1, h2, h3, h4)'
+
+
+class Chapter:
+    def __init__(self, title_node, title, content):
+        self.title_node = title_node
+        self.title = title
+        self.content = content
+
+
+def get_breadcrumbs(body):
+    breadcrumbs = body.get('data-breadcrumbs')
+    return [] if breadcrumbs is None else breadcrumbs.split('///')
+
+
+def drop_irrelevant_sections(article):
+    remove(find(article, ', '.join([
+        '.chapter:has(#what-s-next)', '.chapter:has(#next-step)', '.chapter:has(#next-steps)',
+        '.chapter:has(#learn-more)', '.chapter:has(#leave-feedback)',
+    ])))
+
+
+def replace_media(article, page_url):
+    for video in find(article, '.video-player'):
+        player = video.select_one('object[data]')
+        url = player['data'] if player is not None else None
+        video.replace_with('<%s>' % urlsplit(urljoin(page_url, url)).hostname if url else '<video>')
+
+
+def replace_wrs_semantic(article):
+    replace_node(article, 'span.control', lambda node, attrs, content: '<b %s>%s</b>' % (attrs, content))
+    replace_node(article, 'div.code-block', lambda node, attrs, content: '<code %s>%s</code>' % (attrs, content))
+
+
+def drop_ui_elements(article):
+    remove(find(article, '.last-modified'))
+    remove(find(article, '.navigation-links'))
+    remove(find(article, '[class*="inline-icon-"]'))
+
+
+def pair_title_content(title_node):
+    content_node = None
+    # Title inside a collapsible block
+    chapter_node = title_node.parent
+    if matches(chapter_node, '.collapse__title'):
+        content_node = find_next_element_with(
+            chapter_node, lambda element: matches(element, '.collapse__content, .collapse__body'))
+    return content_node or title_node.next_sibling
+
+
+def is_chapter(node, level):
+    return level == 0 and matches(node, 'section.chapter')
+
+
+def get_introduction(article):
+    titles = find(article, ':scope > ' + title_selector)
+    if not titles:
+        return Chapter(None, [''], '')
+    title_node = titles[0]
+    return Chapter(title_node, [get_text(title_node)], html_to_text([pair_title_content(title_node)], is_chapter))
+
+
+def get_chapters(article):
+    chapters = []
+    for chapter in find(article, ':scope > .chapter'):
+        titles = find([chapter], ':scope > %s, :scope > .collapse > .collapse__title > %s' % (
+            title_selector, title_selector))
+        if titles:
+            chapters.append(Chapter(titles[0], [''.join(get_text(title) for title in titles)], None))
+    return chapters
+
+
+def my_main_title(headings):
+    for index, title in enumerate(headings):
+        if index != len(headings) - 1 and (
+                title.endswith('– tutorial') or re.search(r'advent of code 20\d{2}', title, re.IGNORECASE)):
+            return title
+    return None
+
+
+def get_documentation_records(soup, url):
+    body = soup.select_one('body[data-template]')
+    if body is None or body.get('data-template') != 'article':
+        return []
+
+    article = soup.select('article.article')
+    page_url = get_page_url(soup, url)
+
+    drop_ui_elements(article)
+    drop_irrelevant_sections(article)
+    replace_wrs_semantic(article)
+    replace_media(article, page_url)
+
+    breadcrumbs = get_breadcrumbs(body)
+    page_intro = get_introduction(article)
+    if page_intro.title_node is None:
+        return []
+
+    sub_articles = [page_intro]
+    for chapter in get_chapters(article):
+        chapter_node = [chapter.title_node.parent]
+        sub_articles.append(get_introduction(chapter_node))
+        for sub_chapter in get_chapters(chapter_node):
+            sub_articles.append(Chapter(sub_chapter.title_node, chapter.title + sub_chapter.title,
+                                        html_to_text([pair_title_content(sub_chapter.title_node)])))
+
+    records = []
+    for chapter in sub_articles:
+        if chapter.title_node is None:
+            continue
+        anchor = chapter.title_node.get('id')
+        final_url = '/%s#%s' % (url, anchor)
+
+        page_titles = page_intro.title + chapter.title
+        headings = breadcrumbs + page_titles
+
+        main_title = my_main_title(headings)
+        page_title = page_titles.pop()
+
+        if not main_title:
+            # Arbitrary length, depends on the search UI
+            if len(' '.join(page_titles)) < 65:
+                main_title = page_intro.title[0]
+                page_title = ': '.join(chapter.title)
+            else:
+                main_title = page_titles.pop()
+                top = page_titles.pop() if page_titles else None
+                if top and len(main_title) > len(top):
+                    main_title = top
+
+        # The h1 title has an extra anchor with .md which isn't useful here
+        url_hash = '' if not anchor or anchor.endswith('.md') else '#' + anchor
+
+        records.append(make_record(
+            objectID=final_url,
+            url=urlsplit(urljoin(page_url, final_url)).path + url_hash,
+            parent='/' + url,
+            headings=' | '.join(reversed(headings)),
+            mainTitle=main_title,
+            pageTitle=page_title,
+            content=chapter.content,
+        ))
+    return records
+
+
+# Dokka API reference, parsers/dokka.ts
+
+def levenshtein(a, b):
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+
+def drop_breadcrumbs(article):
+    breadcrumbs_nodes = find(article, '.breadcrumbs')
+    remove(breadcrumbs_nodes)
+
+    breadcrumbs = [get_text(link) for link in find(breadcrumbs_nodes, 'a')]
+
+    if breadcrumbs and breadcrumbs[0] in ('kotlin-stdlib', 'kotlin-test', 'kotlin-reflect'):
+        breadcrumbs.pop(0)
+
+    library_prefix = re.sub(r'-stag(e|ing)\Z', '', os.environ.get('ALGOLIA_INDEX_NAME', ''))
+    if library_prefix:
+        while breadcrumbs and breadcrumbs[0] == library_prefix:
+            breadcrumbs.pop(0)
+
+    return breadcrumbs
+
+
+def drop_title_node(article):
+    title_nodes = find(article, '.cover > h1.cover')
+    if len(title_nodes) > 1:
+        print("err: api package has two headers unexpectedly")
+    remove(title_nodes)
+    return ''.join(get_text(node) for node in title_nodes)
+
+
+def drop_all_types(article):
+    index_headers = find(article, 'h2:-soup-contains("Index"):has(+ a[href*="all-types.html"])')
+    if index_headers:
+        titles = [title for title in index_headers if get_text(title).strip() == 'Index']
+        links = [next_element(title) for title in titles
+                 if matches(next_element(title), 'a[href*="all-types.html"]')]
+
+        if len(titles) != len(links):
+            raise ValueError("drop_all_types: links and titles are not equal: %d != %d" % (len(titles), len(links)))
+
+        remove(titles)
+        remove(links)
+
+
+def drop_working_elements(article):
+    remove(find(article, ','.join([
+        # (source) links
+        ':is(.clearfix,.floating-right):has(a[href*="https://github.com"]:-soup-contains("source"))',
+        # Platform tabs
+        '.platform-bookmarks-row',
+        # Copy icon
+        '.copy-icon, .copy-popup-wrapper',
+        # Since Kotlin section
+        '.kdoc-tag:has(h4:-soup-contains("Since Kotlin"))',
+    ])))
+
+
+def drop_inheritors(article):
+    for title in find(article, 'h4:-soup-contains("Inheritors")'):
+        next_node = next_element(title)
+        if matches(next_node, '.table'):
+            next_node.extract()
+            title.extract()
+
+
+def is_entity_link(link, page_url):
+    host = link.hostname or ''
+    return (
+        (host == page_url.hostname and link.path.startswith('/api/')) or
+        (host == 'docs.oracle.com' and '/docs/api/' in link.path) or
+        (host == 'projectreactor.io' and '/docs/core/' in link.path) or
+        ('javadoc/' in link.path and (host.endswith('reactive-streams.org') or host == 'reactivex.io')) or
+        (host == 'developer.mozilla.org' and (
+            '/docs/Web/JavaScript/Reference/' in link.path or '/docs/Web/API/' in link.path))
+    )
+
+
+def replace_internal_links(article, page_url):
+    def make(node, attrs, content):
+        link = urlsplit(urljoin(page_url.geturl(), node.get('href') or ''))
+        if is_entity_link(link, page_url):
+            return '<a %s><code>%s</code></a>' % (attrs, content)
+        return None
+
+    replace_node(article, 'a', make)
+
+
+def replace_dokka_semantic(article):
+    replace_node(article, '.symbol.monospace', lambda node, attrs, content: '<code %s>%s</code>' % (attrs, content))
+    replace_node(article, 'u', lambda node, attrs, content: '<code %s>%s</code>' % (attrs, content))
+
+
+def replace_platform_duplicate(article):
+    definitions = find(article, ':is(.content.sourceset-dependent-content)')
+
+    remove(token for token in find(definitions, '.token')
+           if get_text(token).strip() in ('actual', 'expect', 'external'))
+
+    if len(definitions) > 1:
+        texts = []
+        for definition in definitions:
+            text = html_to_text([definition.contents[0] if definition.contents else None])
+
+            def is_different(previous):
+                distance = levenshtein(previous, text)
+                return distance > 1 and math.ceil((len(previous) + len(text)) / distance) < 3
+
+            if all(is_different(previous) for previous in texts):
+                texts.append(text)
+            else:
+                definition.extract()
+
+
+def improve_content_nodes(article, page_url):
+    drop_all_types(article)
+    drop_working_elements(article)
+    drop_inheritors(article)
+    replace_platform_duplicate(article)
+    replace_internal_links(article, page_url)
+    replace_dokka_semantic(article)
+
+
+def get_api_records(soup, url):
+    final_url = '/' + url
+    normalized_url = urlsplit(urljoin(site_url + '/', final_url))
+
+    article = soup.select('#main')
+    title = drop_title_node(article)
+    content = ''
+
+    if re.search(r'/kotlin-stdlib/(all-types\.html)?\Z', url):
+        title = 'Kotlin Standard Library'
+    elif re.search(r'/kotlin-test/(all-types\.html)?\Z', url):
+        title = 'Kotlin Test'
+    elif re.search(r'/kotlin-reflect/(all-types\.html)?\Z', url):
+        title = 'Kotlin JVM reflection extensions'
+
+    if url.endswith('/all-types.html'):
+        content = 'All types for ' + title
+        title += ' (alltypes)'
+
+    if any(matches(node, ':has(> .main-content[data-page-type="package"])') for node in article):
+        title = ''.join(get_text(node) for node in find(article, '.breadcrumbs .current'))
+
+    if url.endswith('.html'):
+        # Platform pages like "/api/kotlinx.coroutines/kotlinx-coroutines-core/kotlinx.coroutines/[js]as-promise.html"
+        platform = re.match(r'^\[([a-zA-Z-]+)].+', posixpath.basename(url))
+        if platform and platform.group(1).strip() != 'common':
+            title += ' (' + platform.group(1).strip() + ')'
+
+    if not content:
+        elements = find(article, 'div.cover, div.cover + .platform-hinted')
+
+        if elements:
+            improve_content_nodes(elements, normalized_url)
+
+            for block in find(elements, '.symbol.monospace .block'):
+                block.append(load_html('<span> </span>').span)
+            content = html_to_text([element.contents[0] if element.contents else None for element in elements])
+
+    breadcrumbs = drop_breadcrumbs(article) + [title]
+
+    # A constructor page?
+    if len(breadcrumbs) > 1:
+        item1, item2 = breadcrumbs[-2:]
+        if re.match(r'^[A-Z]', item1) and item1 == item2 and find(article, '.main-content[data-page-type="member"]'):
+            breadcrumbs.pop()
+            breadcrumbs[-1] = '%s &lt;constructor&gt;' % item1
+
+    # A *.Companion page without content of its own?
+    if breadcrumbs[-1] == 'Companion' and content == '`object Companion`':
+        return []
+
+    # "SomeClass > Companion" => "SomeClass.Companion"
+    joined = []
+    for item in breadcrumbs:
+        if item == 'Companion' and joined:
+            joined[-1] = '%s.%s' % (joined[-1], item)
+        else:
+            joined.append(item)
+    breadcrumbs = joined
+
+    main_title = ' › '.join(breadcrumbs)
+
+    return [make_record(
+        objectID=re.sub(r'\.html\Z', '', final_url),
+        url=normalized_url.geturl(),
+        parent=final_url,
+        headings=' | '.join(reversed(breadcrumbs)) if breadcrumbs else title,
+        mainTitle=main_title,
+        pageTitle=main_title,
+        content=content,
+    )]
+
+
+# Legacy markdown pages, parsers/markdown.ts
+
+list_headers = ['h1', 'h2', 'h3', 'h4', 'h5', 'h6']
+
+
+def collect_headings(title_node):
+    """:return: the header and the higher-level headers before it, like [h3, h2, h1]"""
+    headings = [title_node]
+    node = title_node
+    level = title_node.name
+
+    while node is not None and level != 'h1':
+        tags = list_headers[:list_headers.index(level) if level in list_headers else -1]
+        selector = '.typo-header:is(%s)' % ','.join(tags)
+        node = find_prev_element_with(node, lambda element: matches(element, selector))
+        if node is None:
+            break
+        level = node.name
+        headings.append(node)
+
+    return headings
+
+
+def get_legacy_documentation_records(soup, url):
+    article = soup.select('.page-content[role="main"]')
+    page_url = get_page_url(soup, url)
+
+    def is_header(node, level):
+        return level == 0 and matches(node, '.typo-header[id]')
+
+    records = []
+    for title_node in find(article, '.typo-header[id]'):
+        final_url = '/%s#%s' % (url, title_node['id'])
+        headings = [re.sub(r':\Z', '', get_text(node)) for node in collect_headings(title_node)]
+
+        records.append(make_record(
+            objectID=final_url,
+            url=urljoin(page_url, final_url),
+            parent='/' + url,
+            headings=' | '.join(headings),
+            mainTitle=headings[-1],
+            pageTitle=': '.join(reversed(headings[:-1])),
+            content=html_to_text([title_node.next_sibling], is_header),
+        ))
+    return records
+
+
+# Parsers by page type, see `src.search.records.get_page_type()`
+parsers = {
+    'Page_Documentation': get_documentation_records,
+    'Page_API': get_api_records,
+    'Page_LegacyDocumentation': get_legacy_documentation_records,
+}
@@ -0,0 +1,115 @@
+import json
+import re
+from os import path
+
+from src.search.html import load_html
+from src.search.parsers import parsers, site_url
+
+root_folder = path.dirname(path.dirname(path.dirname(__file__)))
+# Written by the PageViews CI job, see .teamcity/scripts/stats/pageviews.mjs
+page_views_file = path.join(root_folder, 'data', 'page_views_map.json')
+
+# Key order of the records pushed by scripts/dist, kept for easier comparison
+record_keys = ['objectID', 'headings', 'mainTitle', 'pageTitle', 'content', 'url', 'type', 'parent', 'pageViews',
+               'product']
+
+
+def is_api_previous_version(url):
+    return re.match(r'^api/[^/]+/(\d+\.\d+(\.\d+)?)(/|\Z)', url) is not None
+
+
+def is_skipped(url):
+    """Whether the dist/ file at `url` (without the leading slash) is skipped by
+    scripts/dist/analyzer before being read: old API versions, the spec and api/latest"""
+    return is_api_previous_version(url) or url.startswith(('spec/', 'api/latest/'))
+
+
+def get_page_type(file_url, soup):
+    """Type of the page at `file_url` (relative to dist/, ending with index.html for folders),
+    as `getType()` of scripts/dist/lib/files/type.ts"""
+    if soup.select_one('meta[http-equiv=refresh]') is not None:
+        return 'Redirect'
+    if soup.select_one('meta[name=robots][content*=noindex]') is not None:
+        return 'Hidden'
+
+    if file_url == '404.html' or re.search(r'404/(index\.html)?', file_url):
+        return 'NotFound'
+    if file_url.startswith('spec/'):
+        return 'Page_Spec'
+    if file_url.startswith('docs/reference/grammar/'):
+        return 'Page_Grammar'
+
+    page_type = 'Page_Undetected'
+    if file_url.startswith('api/'):
+        if file_url.startswith('api/latest/'):
+            page_type = 'Page_API_stdlib' if 'jvm/stdlib' in file_url else 'Page_API_test'
+        elif file_url.endswith('/navigation.html') and \
+                soup.select_one(':is(.sideMenu, .sideMenuPart) .sideMenuPart') is not None:
+            page_type = 'Iframe'
+        elif is_api_previous_version(file_url):
+            return 'Page_API_Deprecated'
+        else:
+            page_type = 'Page_API'
+
+    if file_url.startswith('community/'):
+        page_type = 'Page_Community'
+    if soup.select_one('body[data-article-props]') is not None:
+        page_type = 'Page_Documentation'
+    if soup.select_one('.global-content > article.page-content[role="main"]') is not None:
+        page_type = 'Page_LegacyDocumentation'
+    return page_type
+
+
+def get_page_records(url, html):
+    """:return: tuple of the page type and the search records of the dist/ page at `url`
+
+    Records are the ones scripts/dist/analyzer makes for the page, before `make_search_item()`.
+    """
+    file_url = url[1:] + ('index.html' if url.endswith('/') else '')
+    soup = load_html(html)
+    page_type = get_page_type(file_url, soup)
+
+    parser = parsers.get(page_type)
+    if parser is None:
+        return page_type, []
+
+    # The analyzer strips index.html from folders, to "/" for the home page
+    records = [record for record in parser(soup, url[1:] or '/')
+               if record['objectID'] and record['url'] and record['pageTitle'] and record['content']]
+
+    object_ids = set()
+    for record in records:
+        if record['objectID'] in object_ids:
+            raise ValueError("Object %s isn't unique" % record['objectID'])
+        object_ids.add(record['objectID'])
+    return page_type, records
+
+
+def load_page_views():
+    """:return: dict of absolute page url to its number of views, empty without the statistics file"""
+    try:
+        with open(page_views_file, encoding="UTF-8") as f:
+            return json.load(f)
+    except OSError:
+        return {}
+
+
+def get_page_views(page_views, url):
+    """Views of the page at `url`, 0 (the default of the records) without statistics"""
+    return page_views.get(site_url + url) or 0
+
+
+def make_search_item(url, record, page_views):
+    """The record of the page at `url` as pushed to the search index, as `makeSearchItem()` of
+    scripts/dist/analyzer/reports/utils.ts: with the views of the page, and `<`, `>` escaped in every string.
+
+    Views are keyed by absolute urls, see .teamcity/scripts/stats/pageviews.mjs.
+    """
+    record = dict(record, pageViews=get_page_views(page_views, url))
+    item = {}
+    for key in sorted(record, key=lambda key: record_keys.index(key) if key in record_keys else -1):
+        value = record[key]
+        if isinstance(value, str):
+            value = value.replace('<', '&lt;').replace('>', '&gt;')
+        item[key] = value
+    return item
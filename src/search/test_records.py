@@ -0,0 +1,146 @@
+import os
+import unittest
+from unittest import mock
+
+from src.search.export import seed_delta
+from src.search.html import load_html
+from src.search.records import get_page_records, get_page_type, is_skipped, make_search_item
+
+# Pages shaped like the Writerside and Dokka output in dist/. The expected records are
+# the ones scripts/dist/analyzer gives for them, traced by hand through writerside.ts,
+# dokka.ts, html.ts and makeSearchItem(): cheerio isn't installed to run them here.
+writerside_page = (
+    '<!DOCTYPE html>\n'
+    '<html lang="en-US"><head><meta charset="UTF-8">\n'
+    '<meta property="og:url" content="https://kotlinlang.org/docs/sample.html">\n'
+    '<title>Sample | Kotlin</title></head>\n'
+    '<body data-id="sample" data-main-title="Sample" data-article-props="{}" data-template="article"'
+    ' data-breadcrumbs="Kotlin///Concepts">\n'
+    '<div class="wrapper"><main class="panel _main"><div class="container">\n'
+    '<article class="article" data-shortcut-switcher="inactive"><h1 data-toc="sample" id="sample.md">Sample</h1>\n'
+    '<p>Use <code class="code">val x = 1</code> to declare <b>read-only</b> values.</p>\n'
+    '<section class="chapter"><h2 id="basics" data-toc="basics">Basics</h2><p>Click <span class="control">'
+    'Run</span> for a List&lt;T&gt;.</p>\n'
+    '<ul class="list"><li class="list__item"><p>First</p></li><li class="list__item"><p>Second (item)</p></li>'
+    '</ul>\n'
+    '<section class="chapter"><h3 id="details" data-toc="details">Details</h3><p>More text , here .</p></section>\n'
+    '</section>\n'
+    '<section class="chapter"><div class="collapse"><div class="collapse__title">'
+    '<h2 id="folded" data-toc="folded">Folded</h2></div><div class="collapse__content"><p>Hidden text</p></div>'
+    '</div></section>\n'
+    '<section class="chapter"><h2 id="what-s-next" data-toc="what-s-next">What\'s next</h2><p>Skipped</p>'
+    '</section>\n'
+    '<div class="last-modified">Last modified: 10 May 2024</div>\n'
+    '<div class="navigation-links _bottom"><a href="a.html">Previous</a></div>\n'
+    '</article></div></main></div></body></html>\n'
+)
+
+dokka_page = (
+    '<!DOCTYPE html>\n'
+    '<html><head><meta charset="UTF-8"><title>filterTo</title></head>\n'
+    '<body>\n'
+    '<div class="root">\n'
+    '<div id="main"><div class="main-content" data-page-type="member" id="content">\n'
+    '<div class="breadcrumbs"><a href="../../../index.html">kotlin-stdlib</a><span class="delimiter"></span>'
+    '<a href="../index.html">kotlin.collections</a><span class="delimiter"></span><span class="current">'
+    'filterTo</span></div>\n'
+    '<div class="cover "><h1 class="cover"><span>filter</span><wbr></wbr><span><span>To</span></span></h1></div>\n'
+    '<div class="platform-hinted " data-platform-hinted="data-platform-hinted">'
+    '<div class="platform-bookmarks-row"><button class="platform-bookmark">common</button></div>\n'
+    '<div class="content sourceset-dependent-content" data-active="" data-togglable=":kotlin-stdlib/common">'
+    '<div class="symbol monospace"><div class="block"><span class="token keyword">inline </span>'
+    '<span class="token keyword">fun </span><span class="token operator">&lt;</span>'
+    'T<span class="token operator">&gt; </span><a href="index.html">Iterable</a>.<a href="filter-to.html">'
+    '<span class="token function">filterTo</span></a>(destination: C): C</div><span class="clearfix">'
+    '<span class="floating-right">'
+    '(<a href="https://github.com/JetBrains/kotlin/tree/master/libraries/stdlib/src">source</a>)</span></span>'
+    '</div><p class="paragraph">'
+    'Appends all elements matching the given '
+    '<a href="https://kotlinlang.org/api/core/kotlin-stdlib/kotlin/-function1/">'
+    'predicate</a> to <u>destination</u>.</p></div>\n'
+    '</div></div></div></div></body></html>\n'
+)
+
+
+def record(**fields):
+    result = {
+        'objectID': None, 'headings': None, 'mainTitle': None, 'pageTitle': None, 'content': None, 'url': None,
+        'type': 'Documentation', 'parent': None, 'pageViews': 0, 'product': 'help/kotlin-reference',
+    }
+    result.update(fields)
+    return result
+
+
+def get_items(url, html, page_views=None):
+    page_type, records = get_page_records(url, html)
+    return page_type, [make_search_item(url, record, page_views or {}) for record in records]
+
+
+class PageRecordsTest(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.dict(os.environ)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        os.environ.pop('ALGOLIA_INDEX_NAME', None)
+
+    def test_writerside(self):
+        page_type, items = get_items('/docs/sample.html', writerside_page)
+        self.assertEqual('Page_Documentation', page_type)
+        self.assertEqual([
+            record(objectID='/docs/sample.html#sample.md', headings='Sample | Sample | Concepts | Kotlin',
+                   mainTitle='Sample', pageTitle='Sample',
+                   content='Use `val x = 1` to declare * read-only * values.',
+                   url='/docs/sample.html', parent='/docs/sample.html'),
+            record(objectID='/docs/sample.html#basics', headings='Basics | Sample | Concepts | Kotlin',
+                   mainTitle='Sample', pageTitle='Basics',
+                   content='Click * Run * for a List&lt;T&gt;. \n • First \n • Second (item)',
+                   url='/docs/sample.html#basics', parent='/docs/sample.html'),
+            record(objectID='/docs/sample.html#details', headings='Details | Basics | Sample | Concepts | Kotlin',
+                   mainTitle='Sample', pageTitle='Basics: Details', content='More text, here.',
+                   url='/docs/sample.html#details', parent='/docs/sample.html'),
+            record(objectID='/docs/sample.html#folded', headings='Folded | Sample | Concepts | Kotlin',
+                   mainTitle='Sample', pageTitle='Folded', content='Hidden text',
+                   url='/docs/sample.html#folded', parent='/docs/sample.html'),
+        ], items)
+        self.assertEqual(list(record()), list(items[0]))
+
+    def test_dokka(self):
+        url = '/api/core/kotlin-stdlib/kotlin.collections/filter-to.html'
+        page_type, items = get_items(url, dokka_page, {'https://kotlinlang.org' + url: 42})
+        self.assertEqual('Page_API', page_type)
+        self.assertEqual([
+            record(objectID='/api/core/kotlin-stdlib/kotlin.collections/filter-to',
+                   headings='filterTo | kotlin.collections',
+                   mainTitle='kotlin.collections › filterTo', pageTitle='kotlin.collections › filterTo',
+                   content='`inline fun &lt;T&gt; Iterable.filterTo(destination: C): C` '
+                           'Appends all elements matching the given `predicate` to `destination`.',
+                   url='https://kotlinlang.org' + url, parent=url, pageViews=42),
+        ], items)
+
+    def test_page_type(self):
+        api_page = '<html><body><div id="main"></div></body></html>'
+        self.assertEqual('Page_API', get_page_type('api/core/kotlin-stdlib/index.html', load_html(api_page)))
+        self.assertEqual('Page_API_Deprecated', get_page_type('api/core/1.9/index.html', load_html(api_page)))
+        self.assertEqual('Page_API_stdlib', get_page_type('api/latest/jvm/stdlib/index.html', load_html(api_page)))
+        self.assertEqual('Page_Documentation', get_page_type('docs/sample.html', load_html(writerside_page)))
+        self.assertEqual('Redirect', get_page_type('docs/old.html', load_html(
+            '<html><head><meta http-equiv="refresh" content="0; url=/docs/sample.html"></head></html>')))
+        self.assertEqual('NotFound', get_page_type('404.html', load_html(api_page)))
+
+        self.assertTrue(is_skipped('api/core/1.9/kotlin-stdlib/index.html'))
+        self.assertTrue(is_skipped('api/latest/jvm/stdlib/index.html'))
+        self.assertTrue(is_skipped('spec/introduction.html'))
+        self.assertFalse(is_skipped('api/core/kotlin-stdlib/index.html'))
+
+    def test_seed_delta(self):
+        delta = {'added': [record(objectID='/a'), record(objectID='/b')], 'changed': [], 'removed': []}
+        self.assertIs(delta, seed_delta(delta, None))
+        self.assertEqual({
+            'added': [record(objectID='/a')],
+            'changed': [record(objectID='/b')],
+            'removed': ['/c'],
+        }, seed_delta(delta, ['/b', '/c']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+import mimetypes
+import os
+from os import path
+
+from flask import request, send_file
+from werkzeug.exceptions import NotFound
+from werkzeug.security import safe_join
+
+from src.assets import file_md5
+from src.build.compress import get_encodings, is_up_to_date
+
+# Next.js puts a content hash or the build id into every url under /_next/
+immutable_prefixes = ('/_next/',)
+immutable_cache_control = 'public, max-age=31536000, immutable'
+revalidate_cache_control = 'public, max-age=0, must-revalidate'
+
+# file -> (mtime_ns, size, md5)
+_content_hashes = {}
+
+
+def add_production_headers(response):
+    """Cache headers for the production server.
+
+    Hashed Next.js assets are cached for a year. Everything else is
+    revalidated on every use: files get the MD5 of their content as ETag
+    (see `send_precompressed()`), rendered responses the SHA-1 of their body, and a matching
+    `If-None-Match` is answered with 304 Not Modified.
+    """
+    if request.path.startswith(immutable_prefixes):
+        response.headers['Cache-Control'] = immutable_cache_control
+        return response
+
+    response.headers['Cache-Control'] = revalidate_cache_control
+    if response.status_code != 200 or response.direct_passthrough:
+        # Files are already made conditional by send_file()
+        return response
+
+    response.add_etag()
+    return response.make_conditional(request.environ)
+
+
+def run_production_server(app, host, port, workers):
+    """Serve `app` with gunicorn when it is installed, with one process per
+    worker forked after the app is loaded; otherwise with Werkzeug's
+    forking server."""
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        BaseApplication = None
+
+    if BaseApplication is None:
+        from werkzeug.serving import run_simple
+
+        print("gunicorn is not installed, serving with Werkzeug")
+        if workers > 1:
+            run_simple(host, port, app, processes=workers)
+        else:
+            run_simple(host, port, app, threaded=True)
+        return
+
+    class ProductionApplication(BaseApplication):
+        def load_config(self):
+            self.cfg.set('bind', '%s:%d' % (host, port))
+            self.cfg.set('workers', workers)
+            self.cfg.set('preload_app', True)
+
+        def load(self):
+            return app
+
+    ProductionApplication().run()
+
+
+def get_content_hash(file_path, stat):
+    """:return: MD5 of the content of `file_path`, hashed again only when its mtime or size changed"""
+    stored = _content_hashes.get(file_path)
+    if stored is None or stored[:2] != (stat.st_mtime_ns, stat.st_size):
+        stored = (stat.st_mtime_ns, stat.st_size, file_md5(file_path))
+        _content_hashes[file_path] = stored
+    return stored[2]
+
+
+def send_precompressed(file_path, **kwargs):
+    """`send_file()` serving the `.br` or `.gz` sibling written by the compression
+    stage instead, when the client accepts it and it is up to date.
+
+    The ETag is the content hash of the file sent, not the mtime and size
+    `send_file()` uses, so a rebuilt but unchanged file is still not modified.
+    """
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        raise NotFound()
+
+    precompressed = False
+    for encoding, suffix in get_encodings():
+        if not is_up_to_date(file_path + suffix, stat):
+            continue
+        precompressed = True
+        if not request.accept_encodings[encoding]:
+            continue
+
+        kwargs.setdefault('mimetype', mimetypes.guess_type(file_path)[0] or 'application/octet-stream')
+        kwargs.setdefault('etag', get_content_hash(file_path + suffix, os.stat(file_path + suffix)))
+        response = send_file(file_path + suffix, **kwargs)
+        response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        return response
+
+    kwargs.setdefault('etag', get_content_hash(file_path, stat))
+    response = send_file(file_path, **kwargs)
+    if precompressed:
+        response.vary.add('Accept-Encoding')
+    return response
+
+
+def send_precompressed_from_directory(directory, file_name, **kwargs):
+    """`send_from_directory()` with the content negotiation of `send_precompressed()`"""
+    file_path = safe_join(directory, file_name)
+    if file_path is None or not path.isfile(file_path):
+        raise NotFound()
+    return send_precompressed(file_path, **kwargs)
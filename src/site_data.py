@@ -0,0 +1,111 @@
+import os
+import pickle
+import threading
+from collections.abc import Mapping
+from os import path
+
+from ruamel.yaml import YAML, YAMLError
+
+from src.build.dependencies import record_input
+from src.build.graph import file_sha1
+from src.cache import cache_folder
+
+snapshot_folder = path.join(cache_folder, 'site-data')
+
+
+def parse_data_file(file_path):
+    """Load a data file with the safe loader: no comment and formatting metadata,
+    and the C parser when ruamel.yaml.clib is installed."""
+    with open(file_path, encoding="UTF-8") as stream:
+        return YAML(typ='safe').load(stream)
+
+
+def load_data_file(file_path):
+    """Content of the yml `file_path`, from its pickled snapshot in `.cache/site-data`
+    when there is one for the current version of the file.
+
+    Snapshots are matched by mtime and size, falling back to a content hash,
+    so a touched but unchanged file is not parsed again.
+    """
+    stat = os.stat(file_path)
+    snapshot_file = path.join(snapshot_folder, path.basename(file_path) + '.pickle')
+
+    sha1 = None
+    try:
+        with open(snapshot_file, 'rb') as f:
+            (mtime_ns, size, stored_sha1), data = pickle.load(f)
+        if (mtime_ns, size) == (stat.st_mtime_ns, stat.st_size):
+            return data
+        sha1 = file_sha1(file_path)
+        if sha1 != stored_sha1:
+            data = parse_data_file(file_path)
+    except (OSError, EOFError, ValueError, pickle.UnpicklingError):
+        data = parse_data_file(file_path)
+
+    if sha1 is None:
+        sha1 = file_sha1(file_path)
+
+    try:
+        os.makedirs(snapshot_folder, exist_ok=True)
+        tmp_file = snapshot_file + '.' + str(os.getpid())
+        with open(tmp_file, 'wb') as f:
+            pickle.dump(((stat.st_mtime_ns, stat.st_size, sha1), data), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, snapshot_file)
+    except OSError as e:
+        print("Can't write site data snapshot " + snapshot_file + ": " + str(e))
+
+    return data
+
+
+class SiteData(Mapping):
+    """Site data by data file name, each file loaded on first access.
+
+    Every read of a key records its file as a data dependency of the current
+    render, so the build graph knows which pages use which data files.
+    `reload()` drops the loaded values of changed files, which are loaded again
+    on their next access.
+
+    :param files: dict of key to the yml file it is loaded from
+    :param values: dict of keys that are not backed by a data file
+    """
+
+    def __init__(self, files, values=None):
+        self.files = files
+        self._values = dict(values or {})
+        self._lock = threading.Lock()
+
+    def __getitem__(self, key):
+        file_path = self.files.get(key)
+        if file_path is None:
+            return self._values[key]
+
+        record_input('data', file_path)
+        try:
+            return self._values[key]
+        except KeyError:
+            pass
+
+        with self._lock:
+            if key not in self._values:
+                try:
+                    self._values[key] = load_data_file(file_path)
+                except YAMLError as exc:
+                    raise ValueError('Cant parse data file ' + file_path + ': ' + str(exc)) from exc
+            return self._values[key]
+
+    def reload(self, changed_files):
+        changed_files = set(changed_files)
+        with self._lock:
+            for key, file_path in self.files.items():
+                if file_path in changed_files:
+                    self._values.pop(key, None)
+
+    def __contains__(self, key):
+        return key in self.files or key in self._values
+
+    def __iter__(self):
+        return iter(set(self.files) | set(self._values))
+
+    def __len__(self):
+        return len(set(self.files) | set(self._values))
+
@@ -0,0 +1,173 @@
+import datetime
+import json
+import os
+from os import path
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+
+from src.build.graph import file_sha1
+from src.cache import cache_folder
+
+lastmod_file = path.join(cache_folder, 'sitemap-lastmod.json')
+site_url = 'https://kotlinlang.org'
+# Index of the shards in the freezer output. The sitemap_index.xml of robots.txt is written by
+# the "Build site pages" CI job from the sitemaps of dist/, which this one doesn't repeat
+index_name = 'sitemap-pages.xml'
+shard_name = 'sitemap-pages-%d.xml'
+
+# Limits of a single sitemap file, https://www.sitemaps.org/protocol.html
+max_urls = 50000
+max_bytes = 50 * 1024 * 1024
+
+urlset_start = '<?xml version="1.0" encoding="UTF-8"?>\n' \
+               '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+urlset_end = '</urlset>\n'
+
+
+def get_priority(url):
+    """Priority of `url`, by the rules of the dist analyzer (scripts/dist/analyzer/reports/utils.ts)"""
+    if url == '/':
+        return '1'
+    if url.startswith('/api/'):
+        return '0.5'
+    return '0.8'
+
+
+def read_sitemap_urls(file_path):
+    """:return: set of the `<loc>` urls of the sitemap `file_path`, empty if there is no such file"""
+    urls = set()
+    if not path.exists(file_path):
+        return urls
+    for _, element in ElementTree.iterparse(file_path):
+        if element.tag.endswith('}loc') or element.tag == 'loc':
+            urls.add(element.text.strip())
+        element.clear()
+    return urls
+
+
+class SitemapWriter:
+    """Writes the sitemap of `out_folder` url by url, in shards of at most
+    `max_urls` urls (and `max_bytes`) listed by `sitemap-pages.xml`.
+
+    `lastmod` of a url is the date its built file last changed content: files are
+    hashed (only if their mtime or size changed) and compared to the hashes stored
+    in `.cache/sitemap-lastmod.json` by the previous run.
+
+    :param exclude: urls (with `site_url`) listed by other sitemaps, which are skipped
+    """
+
+    def __init__(self, out_folder, today=None, exclude=()):
+        self.out_folder = out_folder
+        self.today = (today or datetime.date.today()).isoformat()
+        self.exclude = exclude
+        self.excluded = 0
+        # url -> [mtime_ns, size, sha1, lastmod]
+        self.previous = {}
+        self.entries = {}
+        self.shards = []
+        self.changed = 0
+        self._file = None
+        self._shard_urls = 0
+        self._shard_bytes = 0
+        self._shard_lastmod = None
+
+    def __enter__(self):
+        try:
+            with open(lastmod_file, encoding="UTF-8") as f:
+                self.previous = json.load(f)
+        except (OSError, ValueError):
+            self.previous = {}
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            if self._file is not None:
+                self._file.close()
+            return
+        self._close_shard()
+        self._write_index()
+        self._remove_stale_shards()
+
+        os.makedirs(cache_folder, exist_ok=True)
+        tmp_file = lastmod_file + '.' + str(os.getpid())
+        with open(tmp_file, 'w', encoding="UTF-8") as f:
+            json.dump(self.entries, f, sort_keys=True)
+        os.replace(tmp_file, lastmod_file)
+
+    def add(self, url, file_path):
+        """Add `url` built to `file_path`; urls without a built file or excluded are skipped."""
+        location_url = site_url + url
+        # The dist analyzer lists folders for their index.html
+        if location_url in self.exclude or \
+                url.endswith('/index.html') and location_url[:-len('index.html')] in self.exclude:
+            self.excluded += 1
+            return
+        entry = self._check(url, file_path)
+        if entry is None:
+            return
+        self.entries[url] = entry
+
+        location = '  <url>\n    <loc>%s</loc>\n    <priority>%s</priority>\n    <lastmod>%s</lastmod>\n  </url>\n' % \
+                   (escape(location_url), get_priority(url), entry[3])
+        size = len(location.encode("utf8"))
+        if self._file is None or self._shard_urls >= max_urls or \
+                self._shard_bytes + size + len(urlset_end) > max_bytes:
+            self._open_shard()
+        self._file.write(location)
+        self._shard_urls += 1
+        self._shard_bytes += size
+        self._shard_lastmod = max(self._shard_lastmod or entry[3], entry[3])
+
+    def _check(self, url, file_path):
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+
+        stored = self.previous.get(url)
+        if stored is not None and stored[0] == stat.st_mtime_ns and stored[1] == stat.st_size:
+            return stored
+        content_hash = file_sha1(file_path)
+        if stored is not None and stored[2] == content_hash:
+            return [stat.st_mtime_ns, stat.st_size, content_hash, stored[3]]
+        self.changed += 1
+        return [stat.st_mtime_ns, stat.st_size, content_hash, self.today]
+
+    def _open_shard(self):
+        self._close_shard()
+        name = shard_name % (len(self.shards) + 1)
+        self._file = open(path.join(self.out_folder, name + '.' + str(os.getpid())), 'w', encoding="UTF-8")
+        self._file.write(urlset_start)
+        self.shards.append([name, None])
+        self._shard_urls = 0
+        self._shard_bytes = len(urlset_start)
+        self._shard_lastmod = None
+
+    def _close_shard(self):
+        if self._file is None:
+            return
+        self._file.write(urlset_end)
+        self._file.close()
+        self._file = None
+        name = self.shards[-1][0]
+        self.shards[-1][1] = self._shard_lastmod
+        os.replace(path.join(self.out_folder, name + '.' + str(os.getpid())), path.join(self.out_folder, name))
+
+    def _write_index(self):
+        index_path = path.join(self.out_folder, index_name)
+        tmp_file = index_path + '.' + str(os.getpid())
+        with open(tmp_file, 'w', encoding="UTF-8") as f:
+            f.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                    '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n')
+            for name, lastmod in self.shards:
+                f.write('  <sitemap>\n    <loc>%s</loc>\n    <lastmod>%s</lastmod>\n  </sitemap>\n' %
+                        (escape(site_url + '/' + name), lastmod))
+            f.write('</sitemapindex>\n')
+        os.replace(tmp_file, index_path)
+
+    def _remove_stale_shards(self):
+        # Shards left over from a previous run with more urls
+        number = len(self.shards) + 1
+        while path.exists(path.join(self.out_folder, shard_name % number)):
+            os.remove(path.join(self.out_folder, shard_name % number))
+            number += 1
@@ -0,0 +1,95 @@
+import os
+import shutil
+import tempfile
+import unittest
+from os import path
+from unittest import mock
+
+import src.build.graph
+from src.build.dependencies import get_fingerprint
+from src.build.graph import BuildGraph
+
+
+class BuildGraphTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+        patcher = mock.patch.multiple(src.build.graph, root_folder=self.folder,
+                                      cache_folder=path.join(self.folder, '.cache'),
+                                      graph_file=path.join(self.folder, '.cache', 'build-graph.json'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.source = self.write('pages/page.md', 'text')
+        self.template = self.write('templates/page.html', '{{ page }}')
+        self.output = self.write('build/page.html', '<p>text</p>')
+
+    def write(self, name, content, mtime=None):
+        file_path = path.join(self.folder, name)
+        os.makedirs(path.dirname(file_path), exist_ok=True)
+        with open(file_path, 'w', encoding="UTF-8") as f:
+            f.write(content)
+        if mtime is not None:
+            os.utime(file_path, ns=(mtime, mtime))
+        return file_path
+
+    def build(self, signature='code', fingerprints=None):
+        graph = BuildGraph(signature)
+        graph.update('/page.html', {'source': [self.source], 'templates': [self.template]},
+                     [['page', {'page_path': 'other'}]], fingerprints)
+        graph.save()
+
+    def load(self, signature='code'):
+        graph = BuildGraph(signature)
+        graph.load()
+        return graph
+
+    def test_unchanged(self):
+        self.build()
+        graph = self.load()
+        self.assertTrue(graph.is_fresh('/page.html', self.output))
+        self.assertEqual([('page', {'page_path': 'other'})], graph.linked_urls('/page.html'))
+        self.assertFalse(graph.is_fresh('/other.html', self.output))
+
+    def test_touched_input(self):
+        self.build()
+        os.utime(self.template, ns=(10 ** 9, 10 ** 9))
+        self.assertTrue(self.load().is_fresh('/page.html', self.output))
+
+    def test_changed_input(self):
+        self.build()
+        self.write('templates/page.html', '<b>{{ page }}</b>')
+        self.assertFalse(self.load().is_fresh('/page.html', self.output))
+
+    def test_removed_input_or_output(self):
+        self.build()
+        os.remove(self.output)
+        self.assertFalse(self.load().is_fresh('/page.html', self.output))
+
+        self.write('build/page.html', '<p>text</p>')
+        os.remove(self.source)
+        self.assertFalse(self.load().is_fresh('/page.html', self.output))
+
+    def test_changed_signature(self):
+        self.build()
+        self.assertFalse(self.load('other code').is_fresh('/page.html', self.output))
+
+    def test_input_changed_while_read(self):
+        # Read from files that were just modified: the output may not match them, it isn't saved
+        self.build(fingerprints={self.source: get_fingerprint(self.source)})
+        self.assertFalse(self.load().is_fresh('/page.html', self.output))
+
+        self.write('pages/page.md', 'text', mtime=10 ** 9)
+        self.build(fingerprints={self.source: get_fingerprint(self.source)})
+        self.assertTrue(self.load().is_fresh('/page.html', self.output))
+
+    def test_retain(self):
+        self.build()
+        graph = self.load()
+        graph.retain({'/other.html'})
+        graph.save()
+        self.assertFalse(self.load().is_fresh('/page.html', self.output))
+
+
+if __name__ == '__main__':
+    unittest.main()
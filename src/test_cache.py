@@ -0,0 +1,80 @@
+import os
+import shutil
+import tempfile
+import unittest
+from os import path
+from unittest import mock
+
+import src.cache
+from src.cache import DiskCache, cache_key
+
+
+class CacheKeyTest(unittest.TestCase):
+    def test_parts(self):
+        self.assertEqual(cache_key('kramdown', 'text'), cache_key('kramdown', b'text'))
+        self.assertNotEqual(cache_key('kramdown', 'text'), cache_key('kramdown', 'other text'))
+        # Parts are length-prefixed, moving a boundary changes the key
+        self.assertNotEqual(cache_key('ab', 'c'), cache_key('a', 'bc'))
+
+
+class DiskCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+        with mock.patch.object(src.cache, 'cache_folder', self.folder):
+            self.cache = DiskCache('test', 100)
+
+    def test_hit_and_miss(self):
+        key = cache_key('command', 'text')
+        self.assertIsNone(self.cache.get(key))
+
+        self.cache.put(key, b'html')
+        self.assertEqual(b'html', self.cache.get(key))
+        self.assertTrue(path.isfile(path.join(self.folder, 'test', key[:2], key)))
+
+        # Another cache with the same name reads the same entries
+        with mock.patch.object(src.cache, 'cache_folder', self.folder):
+            self.assertEqual(b'html', DiskCache('test', 100).get(key))
+
+    def test_changed_input_misses(self):
+        self.cache.put(cache_key('command', 'text'), b'html')
+        self.assertIsNone(self.cache.get(cache_key('command', 'changed text')))
+        self.assertIsNone(self.cache.get(cache_key('other command', 'text')))
+
+    def test_disabled(self):
+        key = cache_key('text')
+        self.cache.put(key, b'html')
+        self.cache.enabled = False
+        self.assertIsNone(self.cache.get(key))
+        self.cache.put(cache_key('other'), b'html')
+        self.cache.enabled = True
+        self.assertIsNone(self.cache.get(cache_key('other')))
+
+    def test_clear(self):
+        key = cache_key('text')
+        self.cache.put(key, b'html')
+        self.cache.clear()
+        self.assertIsNone(self.cache.get(key))
+        self.cache.put(key, b'html')
+        self.assertEqual(b'html', self.cache.get(key))
+
+    def test_eviction(self):
+        keys = [cache_key(str(number)) for number in range(3)]
+        for number, key in enumerate(keys):
+            self.cache.put(key, b'x' * 30)
+            entry_path = path.join(self.folder, 'test', key[:2], key)
+            os.utime(entry_path, (number, number))
+
+        # A hit makes the oldest entry the most recently used
+        self.assertIsNotNone(self.cache.get(keys[0]))
+        # Over the size: the least recently used entry goes, which is enough to get down to 90%
+        self.cache.put(cache_key('new'), b'x' * 30)
+
+        self.assertIsNotNone(self.cache.get(keys[0]))
+        self.assertIsNotNone(self.cache.get(cache_key('new')))
+        self.assertIsNotNone(self.cache.get(keys[2]))
+        self.assertIsNone(self.cache.get(keys[1]))
+
+
+if __name__ == '__main__':
+    unittest.main()
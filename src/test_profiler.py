@@ -0,0 +1,78 @@
+import unittest
+from unittest import mock
+
+from src.build import profiler
+
+
+class Clock:
+    def __init__(self):
+        self.now = 10 ** 9
+
+    def perf_counter_ns(self):
+        return self.now
+
+    def advance(self, ms):
+        self.now += ms * 1000 * 1000
+
+
+class ProfilerTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        patcher = mock.patch.object(profiler.time, 'perf_counter_ns', self.clock.perf_counter_ns)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        profiler.drain_events()
+        profiler.set_profiling_enabled(True)
+        self.addCleanup(profiler.drain_events)
+        self.addCleanup(profiler.set_profiling_enabled, False)
+
+    def events(self):
+        """:return: (name, page, start, duration, self duration) of the events, in ms"""
+        return [(name, page, start // 1000, duration // 1000, self_duration // 1000)
+                for name, page, start, duration, self_duration, _, _, _, _ in profiler.drain_events()]
+
+    def test_nesting(self):
+        with profiler.page('/docs/page.html'):
+            self.clock.advance(1)
+            with profiler.stage('render'):
+                self.clock.advance(3)
+                with profiler.stage('kramdown'):
+                    self.clock.advance(2)
+                with profiler.stage('kramdown'):
+                    self.clock.advance(4)
+            self.clock.advance(5)
+
+        # Inner stages end first, and belong to the page they ran for
+        self.assertEqual([
+            ('kramdown', '/docs/page.html', 4, 2, 2),
+            ('kramdown', '/docs/page.html', 6, 4, 4),
+            ('render', '/docs/page.html', 1, 9, 3),
+            ('page', '/docs/page.html', 0, 15, 6),
+        ], self.events())
+
+    def test_page_of_stage(self):
+        with profiler.stage('sitemap'):
+            self.clock.advance(1)
+        with profiler.stage('links', page='/index.html'):
+            self.clock.advance(1)
+        self.assertEqual([('sitemap', None, 0, 1, 1), ('links', '/index.html', 1, 1, 1)], self.events())
+
+    def test_disabled(self):
+        profiler.set_profiling_enabled(False)
+        with profiler.page('/docs/page.html'):
+            with profiler.stage('render'):
+                self.clock.advance(1)
+        self.assertEqual([], self.events())
+
+    def test_summary(self):
+        for duration in (2, 6):
+            with profiler.page('/page-%d.html' % duration):
+                with profiler.stage('render'):
+                    self.clock.advance(duration)
+        summary = profiler.get_summary()
+        self.assertLess(summary.index('/page-6.html'), summary.index('/page-2.html'))
+        self.assertRegex(summary, r'render +8\.0 ms total +2 calls +4\.00 ms avg +6\.0 ms max')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import os
+import shutil
+import tempfile
+import unittest
+from os import path
+
+from ruamel.yaml import YAML
+
+from src.build.dependencies import recording_dependencies
+from src.redirects import RedirectIndex, get_redirect_files, redirects_folder
+
+stdlib_file = path.join(redirects_folder, 'stdlib-redirects.yml')
+
+
+def load_redirects(file_path):
+    """The redirects of `file_path` read straight from the YAML, as source -> (target, file)"""
+    redirects = {}
+    with open(file_path, encoding="UTF-8") as f:
+        for entry in YAML(typ='safe').load(f) or []:
+            for source in entry["from"] if isinstance(entry["from"], list) else [entry["from"]]:
+                redirects[source] = (entry["to"], file_path)
+    return redirects
+
+
+class RedirectIndexTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.folder = tempfile.mkdtemp()
+        cls.files = get_redirect_files()
+        cls.index = RedirectIndex(cls.files, path.join(cls.folder, 'redirects.idx'))
+        cls.api = RedirectIndex(cls.files, path.join(cls.folder, 'redirects.idx'), selected=[stdlib_file])
+        cls.by_file = {file_path: load_redirects(file_path) for file_path in cls.files}
+        # Later files override earlier ones
+        cls.expected = {}
+        for file_path in cls.files:
+            cls.expected.update(cls.by_file[file_path])
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.index._data.close()
+        cls.api._data.close()
+        shutil.rmtree(cls.folder)
+
+    def test_all_files(self):
+        self.assertEqual({source: target for source, (target, _) in self.expected.items()}, dict(self.index.items()))
+        self.assertEqual(len(self.expected), len(self.index))
+        for source, (target, _) in self.expected.items():
+            self.assertEqual(target, self.index.lookup(source), source)
+
+    def test_selected_files(self):
+        expected = self.by_file[stdlib_file]
+        self.assertEqual({source: target for source, (target, _) in expected.items()}, dict(self.api.items()))
+        sample = sorted(expected)[::100]
+        for source in sample:
+            self.assertEqual(expected[source][0], self.api.get(source), source)
+        other = [source for source, (_, file_path) in self.expected.items() if source not in expected]
+        self.assertTrue(other)
+        for source in other:
+            self.assertIsNone(self.api.get(source), source)
+
+    def test_missing(self):
+        self.assertIsNone(self.index.lookup('/no/such/page.html'))
+        self.assertIsNone(self.index.lookup(''))
+        self.assertNotIn('/no/such/page.html', self.index)
+        with self.assertRaises(KeyError):
+            self.index['/no/such/page.html']
+
+    def test_dependencies(self):
+        source, (target, file_path) = next(iter(self.expected.items()))
+        with recording_dependencies() as dependencies:
+            self.index.lookup(source)
+        self.assertEqual({file_path}, dependencies.inputs['data'])
+
+        with recording_dependencies() as dependencies:
+            self.api.lookup('/no/such/page.html')
+        self.assertEqual({stdlib_file}, dependencies.inputs['data'])
+
+    def test_recompiled_on_change(self):
+        folder = tempfile.mkdtemp()
+        try:
+            file_path = path.join(folder, 'redirects.yml')
+            with open(file_path, 'w', encoding="UTF-8") as f:
+                f.write('- from: /a.html\n  to: /b.html\n')
+            index = RedirectIndex([file_path], path.join(folder, 'redirects.idx'))
+            self.assertEqual('/b.html', index.lookup('/a.html'))
+            index._data.close()
+
+            with open(file_path, 'w', encoding="UTF-8") as f:
+                f.write('- from: [/a.html, /c.html]\n  to: /d.html\n')
+            os.utime(file_path, ns=(0, 0))
+            index = RedirectIndex([file_path], path.join(folder, 'redirects.idx'))
+            self.assertEqual({'/a.html': '/d.html', '/c.html': '/d.html'}, dict(index.items()))
+            index._data.close()
+        finally:
+            shutil.rmtree(folder)
+
+
+if __name__ == '__main__':
+    unittest.main()
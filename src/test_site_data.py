@@ -0,0 +1,75 @@
+import glob
+import shutil
+import tempfile
+import unittest
+from os import path
+from unittest import mock
+
+from ruamel.yaml import YAML
+
+import src.site_data
+from src.site_data import load_data_file, parse_data_file
+
+data_folder = path.join(path.dirname(path.dirname(__file__)), 'data')
+
+
+def load_round_trip(file_path):
+    """The data file as the site loaded it before, with the round-trip loader"""
+    with open(file_path, encoding="UTF-8") as stream:
+        return YAML(typ='rt').load(stream)
+
+
+def plain(value):
+    """`value` with the round-trip types (CommentedMap, ScalarFloat, LiteralScalarString...) turned into plain ones"""
+    if isinstance(value, dict):
+        return {key: plain(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [plain(item) for item in value]
+    for base in (bool, int, float, str):
+        if isinstance(value, base):
+            return base(value)
+    return value
+
+
+class SiteDataLoadersTest(unittest.TestCase):
+    files = sorted(file_path for file_path in glob.glob(path.join(data_folder, '*.yml'))
+                   if not path.basename(file_path).startswith('_'))
+
+    def assertSameData(self, expected, actual, where):
+        self.assertEqual(type(expected), type(actual), where)
+        if isinstance(expected, dict):
+            self.assertEqual(list(expected), list(actual), where)
+            for key in expected:
+                self.assertSameData(expected[key], actual[key], where + '.' + str(key))
+        elif isinstance(expected, list):
+            self.assertEqual(len(expected), len(actual), where)
+            for index, (a, b) in enumerate(zip(expected, actual)):
+                self.assertSameData(a, b, '%s[%d]' % (where, index))
+        else:
+            self.assertEqual(expected, actual, where)
+
+    def test_files_found(self):
+        self.assertTrue(self.files)
+
+    def test_safe_loader_matches_round_trip(self):
+        for file_path in self.files:
+            with self.subTest(file=path.basename(file_path)):
+                self.assertSameData(plain(load_round_trip(file_path)), parse_data_file(file_path),
+                                    path.basename(file_path))
+
+    def test_snapshot_matches_safe_loader(self):
+        folder = tempfile.mkdtemp()
+        try:
+            with mock.patch.object(src.site_data, 'snapshot_folder', folder):
+                for file_path in self.files:
+                    with self.subTest(file=path.basename(file_path)):
+                        parsed = parse_data_file(file_path)
+                        # Written by the first load, read by the second
+                        self.assertSameData(parsed, load_data_file(file_path), path.basename(file_path))
+                        self.assertSameData(parsed, load_data_file(file_path), path.basename(file_path))
+        finally:
+            shutil.rmtree(folder)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+from os import path
+from unittest import mock
+from xml.etree import ElementTree
+
+import src.sitemap
+from src.sitemap import SitemapWriter, index_name, read_sitemap_urls, shard_name, site_url
+
+namespace = '{http://www.sitemaps.org/schemas/sitemap/0.9}'
+
+
+class SitemapWriterTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.out_folder = path.join(self.folder, 'build')
+        os.makedirs(self.out_folder)
+        patcher = mock.patch.multiple(src.sitemap, lastmod_file=path.join(self.folder, 'lastmod.json'),
+                                      cache_folder=self.folder, max_urls=3)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(shutil.rmtree, self.folder)
+
+    def write_page(self, url, content):
+        file_path = path.join(self.out_folder, *url.strip('/').split('/'))
+        os.makedirs(path.dirname(file_path), exist_ok=True)
+        with open(file_path, 'w', encoding="UTF-8") as f:
+            f.write(content)
+        return file_path
+
+    def write_sitemap(self, urls, day, exclude=()):
+        with SitemapWriter(self.out_folder, datetime.date(2024, 1, day), exclude) as sitemap:
+            for url in urls:
+                sitemap.add(url, path.join(self.out_folder, *url.strip('/').split('/')))
+        return sitemap
+
+    def read_shard(self, number):
+        tree = ElementTree.parse(path.join(self.out_folder, shard_name % number))
+        return [(url.find(namespace + 'loc').text, url.find(namespace + 'lastmod').text,
+                 url.find(namespace + 'priority').text) for url in tree.getroot()]
+
+    def test_shards(self):
+        urls = ['/page-%d.html' % number for number in range(7)]
+        for url in urls:
+            self.write_page(url, url)
+        sitemap = self.write_sitemap(urls + ['/missing.html'], 1)
+
+        self.assertEqual(7, len(sitemap.entries))
+        self.assertEqual([shard_name % number for number in (1, 2, 3)], [name for name, _ in sitemap.shards])
+        self.assertEqual([(site_url + url, '2024-01-01', '0.8') for url in urls[:3]], self.read_shard(1))
+        self.assertEqual([(site_url + urls[6], '2024-01-01', '0.8')], self.read_shard(3))
+
+        index = ElementTree.parse(path.join(self.out_folder, index_name)).getroot()
+        self.assertEqual([site_url + '/' + shard_name % number for number in (1, 2, 3)],
+                         [sitemap.find(namespace + 'loc').text for sitemap in index])
+
+        # Fewer urls: the shards of the previous run are removed
+        self.write_sitemap(urls[:2], 2)
+        self.assertTrue(path.exists(path.join(self.out_folder, shard_name % 1)))
+        self.assertFalse(path.exists(path.join(self.out_folder, shard_name % 2)))
+        self.assertFalse(path.exists(path.join(self.out_folder, shard_name % 3)))
+
+    def test_changed(self):
+        urls = ['/a.html', '/b.html', '/api/c.html']
+        for url in urls:
+            self.write_page(url, url)
+        self.assertEqual(3, self.write_sitemap(urls, 1).changed)
+
+        # Unchanged, touched, and changed content
+        self.assertEqual(0, self.write_sitemap(urls, 2).changed)
+        file_path = self.write_page('/a.html', '/a.html')
+        os.utime(file_path, ns=(0, 0))
+        self.write_page('/b.html', 'changed')
+        sitemap = self.write_sitemap(urls, 3)
+
+        self.assertEqual(1, sitemap.changed)
+        self.assertEqual([(site_url + '/a.html', '2024-01-01', '0.8'),
+                          (site_url + '/b.html', '2024-01-03', '0.8'),
+                          (site_url + '/api/c.html', '2024-01-01', '0.5')], self.read_shard(1))
+
+    def test_exclude(self):
+        dist_sitemap = path.join(self.folder, 'sitemap.xml')
+        with open(dist_sitemap, 'w', encoding="UTF-8") as f:
+            f.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                    '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+                    '<url><loc>https://kotlinlang.org/a.html</loc><priority>0.8</priority></url>\n'
+                    '<url><loc>https://kotlinlang.org/api/core/</loc><priority>0.5</priority></url>\n'
+                    '</urlset>')
+        exclude = read_sitemap_urls(dist_sitemap)
+        self.assertEqual({site_url + '/a.html', site_url + '/api/core/'}, exclude)
+        self.assertEqual(set(), read_sitemap_urls(path.join(self.folder, 'missing.xml')))
+
+        urls = ['/a.html', '/b.html', '/api/core/index.html']
+        for url in urls:
+            self.write_page(url, url)
+        sitemap = self.write_sitemap(urls, 1, exclude)
+        self.assertEqual(2, sitemap.excluded)
+        self.assertEqual([(site_url + '/b.html', '2024-01-01', '0.8')], self.read_shard(1))
+
+
+if __name__ == '__main__':
+    unittest.main()